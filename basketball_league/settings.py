@@ -77,6 +77,62 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# the default cache must be shared by the workers in production (e.g. django.core.cache.backends.redis.RedisCache
+# with CACHE_LOCATION=redis://127.0.0.1:6379), the per process LocMemCache is meant for development and tests
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    },
+    # user snapshots of authenticated tokens, per process: invalidations only reach the worker that made them,
+    # the timeout bounds how long the other workers accept a revoked token or a changed role
+    'auth_tokens': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auth-tokens',
+        'TIMEOUT': 5,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# a per process cache only sees the invalidations made by its own worker, the timeouts below then bound how long
+# the other workers serve stale payloads
+PER_PROCESS_CACHE = CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache'
+
+# Scoreboard pages are invalidated by the games version, the timeout only evicts pages of old versions
+SCOREBOARD_CACHE_TIMEOUT = 5 if PER_PROCESS_CACHE else 60 * 60
+
+# Team and player detail payloads are invalidated by signals, the timeout bounds a missed invalidation
+OBJECT_CACHE_TIMEOUT = 5 if PER_PROCESS_CACHE else 60 * 10
+
+# Live scores, served as server-sent events by the ASGI application
+LIVE_SCORES_BROADCASTER = 'league_api.broadcast.InProcessBroadcaster'
+LIVE_SCORES_QUEUE_SIZE = 100
+LIVE_SCORES_HEARTBEAT = 15
+LIVE_SCORES_RETRY_MS = 3000
+
+# Rows fetched per round trip when streaming exports
+EXPORT_CHUNK_SIZE = 2000
+
+# Raw login sessions older than this are pruned by the rollup_login_activity command once rolled up
+LOGIN_ACTIVITY_RETENTION_DAYS = 90
+
+# Login activity rows are buffered and bulk inserted, SYNC inserts them one by one (e.g. for tests)
+LOGIN_ACTIVITY_SYNC = config('LOGIN_ACTIVITY_SYNC', default=False, cast=bool)
+LOGIN_ACTIVITY_BUFFER_SIZE = 100
+LOGIN_ACTIVITY_FLUSH_INTERVAL = 5
+
+# Bulk registrations: rows checked and inserted per batch, processes hashing passwords (None: one per CPU, 0: inline),
+# the register/bulk/ API keeps its pool for the life of the worker process
+REGISTRATION_BATCH_SIZE = 500
+REGISTRATION_HASH_WORKERS = None
+
+# Players a team can have, enforced when a player joins
+TEAM_MAX_PLAYERS = 10
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -124,9 +180,20 @@ AUTH_USER_MODEL = 'league_api.User'
 # Django REST framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'league_api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'league_api.renderers.ORJSONRenderer',
+        'league_api.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'league_api.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
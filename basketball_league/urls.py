@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include, re_path
-from league_api.views import (ScoreboardView, PlayerDetailView, TeamListView, PlayerListView, TeamDetailView, SiteStatisticsView, RegisterCaochView, RegisterPlayerView, CreateGameView, CreateTeamView, CustomAuthToken, LogoutView, CurrentUserView, UpdateCountGamesView, RemovePlayerView, JoinTeamView, UpdateTeamScoreView, UpdateAVGTeamScoreView, UpdateAVGPlayerScoreView)
+from league_api.views import (ScoreboardView, PlayerDetailView, TeamListView, PlayerListView, TeamDetailView, SiteStatisticsView, RegisterCaochView, RegisterPlayerView, CreateGameView, CreateTeamView, CustomAuthToken, LogoutView, CurrentUserView, UpdateCountGamesView, RemovePlayerView, JoinTeamView, UpdateTeamScoreView, UpdateAVGTeamScoreView, UpdateAVGPlayerScoreView, StandingsView, CacheStatsView, LiveScoresView, ExportView, OnlineUsersView, ActivityRollupView, EngagementView, LeaderboardView, LeaderboardPlayerView, LeaderboardPercentileView, BatchUpdateTeamScoreView, UpdateRosterCountGamesView, BulkRegisterView, RecordGameStatsView, ScoreEventView, FinalizeGameView)
 
 custom_pool_urls = [
 
@@ -11,16 +11,32 @@ custom_pool_urls = [
 
     # Admin, Coach, Player can be able to access the API
     path('scoreboard/', ScoreboardView.as_view(), name='scoreboard'),
+    path('standings/', StandingsView.as_view(), name='standings'),
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    path('leaderboard/players/<int:pk>/', LeaderboardPlayerView.as_view(), name='leaderboard_player'),
+    path('leaderboard/percentile/', LeaderboardPercentileView.as_view(), name='leaderboard_percentile'),
+    path('live/scores/', LiveScoresView.as_view(), name='live_scores'),
+    path('live/scores/<int:pk>/', LiveScoresView.as_view(), name='live_game_scores'),
     path('teams/<int:pk>/', TeamDetailView.as_view(), name='team_detail'), # Admin can access all teams, Coach can access only his team details
     path('player/<int:pk>/', PlayerDetailView.as_view(), name='player_detail'),
 
     # Only for Admin
     path('teams/', TeamListView.as_view(), name='team_list'),
     path('statistics/', SiteStatisticsView.as_view(), name='site_statistics'),
+    path('statistics/activity/', ActivityRollupView.as_view(), name='activity_rollups'),
+    path('statistics/engagement/', EngagementView.as_view(), name='engagement'),
+    path('online/', OnlineUsersView.as_view(), name='online_users'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache_stats'),
+    path('export/<str:resource>/', ExportView.as_view(), name='export'),
     path('register/coach/', RegisterCaochView.as_view(), name='register_coach'),
     path('register/player/', RegisterPlayerView.as_view(), name='register_player'),
+    path('register/bulk/', BulkRegisterView.as_view(), name='register_bulk'),
     path('create/game/', CreateGameView.as_view(), name='create_game'),
     path('update-scores-team/', UpdateTeamScoreView.as_view(), name='update_team_score'),
+    path('update-scores-team/batch/', BatchUpdateTeamScoreView.as_view(), name='batch_update_team_score'),
+    path('live/events/', ScoreEventView.as_view(), name='score_events'),
+    path('games/<int:pk>/finalize/', FinalizeGameView.as_view(), name='finalize_game'),
+    path('game-stats/', RecordGameStatsView.as_view(), name='record_game_stats'),
     path('update-avg-scores-team/', UpdateAVGTeamScoreView.as_view(), name='update_avg_team_score'),
     path('update-avg-scores-player/', UpdateAVGPlayerScoreView.as_view(), name='update_avg_player_score'),
 
@@ -28,6 +44,7 @@ custom_pool_urls = [
     path('teams/<int:pk>/players/', PlayerListView.as_view(), name='player_list'), # Filter avg > 90% players, A coach can see only his team player details.
     path('create/team/', CreateTeamView.as_view(), name='create_team'),
     path('update-count-games/', UpdateCountGamesView.as_view(), name='update_count_played_games'), # A coach can be able to update only his team's player records
+    path('update-count-games/roster/', UpdateRosterCountGamesView.as_view(), name='update_roster_played_games'), # Once per game, for the coach's own team
     path('players/<int:pk>/remove/', RemovePlayerView.as_view(), name='remove-player'), # A coach can be able to remove only his team's players
 
     # Only for Player
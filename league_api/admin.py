@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext as _
-from .models import User, Team, Player, Game, LoginActivity
+from .models import User, Team, Player, Game, LoginActivity, OnlineSession, PlayerGameStat
+from .stats import recompute_averages
 
 class UserAdmin(BaseUserAdmin):
     ordering = ['email']
@@ -40,9 +41,32 @@ class LoginActivityAdmin(admin.ModelAdmin):
     list_display = ['user', 'login_time', 'logout_time']
     list_filter = ['user', 'login_time', 'logout_time']
 
+class OnlineSessionAdmin(admin.ModelAdmin):
+    list_display = ['user', 'since']
+
+class PlayerGameStatAdmin(admin.ModelAdmin):
+    list_display = ['game', 'player', 'team', 'points', 'minutes']
+    list_filter = ['team']
+
+    # corrections are folded into the averages by recomputing the player and the team from their stat lines
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        recompute_averages([obj.player_id], [obj.team_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        recompute_averages([obj.player_id], [obj.team_id])
+
+    def delete_queryset(self, request, queryset):
+        affected = list(queryset.values_list('player_id', 'team_id'))
+        super().delete_queryset(request, queryset)
+        recompute_averages({player_id for player_id, _ in affected}, {team_id for _, team_id in affected})
+
 # Register the models with the admin site
 admin.site.register(User, UserAdmin)
 admin.site.register(Team, TeamAdmin)
 admin.site.register(Player, PlayerAdmin)
 admin.site.register(Game, GameAdmin)
 admin.site.register(LoginActivity, LoginActivityAdmin)
+admin.site.register(OnlineSession, OnlineSessionAdmin)
+admin.site.register(PlayerGameStat, PlayerGameStatAdmin)
@@ -0,0 +1,116 @@
+from datetime import date
+from django.db import connection
+from .models import LoginActivity, User
+
+PERCENTILES = (0.5, 0.9, 0.99)
+
+# vendor specific fragments, every other part of the query is portable SQL with window functions
+DIALECTS = {
+    'postgresql': {
+        'day': "(({column}) AT TIME ZONE 'UTC')::date",
+        'duration': 'EXTRACT(EPOCH FROM (logout_time - login_time))',
+        # ordered-set aggregates, evaluated while grouping the sessions per day and role
+        'percentiles': ', '.join(
+            f'PERCENTILE_DISC({p}) WITHIN GROUP (ORDER BY duration) FILTER (WHERE duration IS NOT NULL) AS p{round(p * 100)}'
+            for p in PERCENTILES
+        ),
+        'percentile_source': 'durations',
+    },
+    'fallback': {
+        'day': 'date({column})',
+        # julianday() is a float of days, rounding drops the noise below the millisecond
+        'duration': 'ROUND((julianday(logout_time) - julianday(login_time)) * 86400.0, 3)',
+        # nearest rank: the smallest duration whose rank reaches p * n
+        'percentiles': ', '.join(
+            f'MIN(CASE WHEN duration_rank >= {p} * duration_count THEN duration END) AS p{round(p * 100)}'
+            for p in PERCENTILES
+        ),
+        'percentile_source': 'ranked_durations',
+    },
+}
+
+ENGAGEMENT_SQL = """
+WITH sessions AS (
+    SELECT activity.user_id, account.role, activity.login_time, activity.logout_time
+    FROM {activity_table} activity
+    JOIN {user_table} account ON account.id = activity.user_id
+    WHERE activity.login_time < %s AND (activity.logout_time IS NULL OR activity.logout_time >= %s)
+),
+durations AS (
+    SELECT {login_day} AS day, role, user_id, {duration} AS duration
+    FROM sessions
+    WHERE login_time >= %s
+),
+ranked_durations AS (
+    SELECT day, role, user_id, duration,
+           ROW_NUMBER() OVER (PARTITION BY day, role ORDER BY duration) AS duration_rank,
+           COUNT(duration) OVER (PARTITION BY day, role) AS duration_count
+    FROM durations
+    WHERE duration IS NOT NULL
+),
+daily AS (
+    SELECT day, role, COUNT(DISTINCT user_id) AS daily_active_users
+    FROM durations
+    GROUP BY day, role
+),
+session_lengths AS (
+    SELECT day, role, {percentiles}
+    FROM {percentile_source}
+    GROUP BY day, role
+),
+events AS (
+    SELECT role, login_time AS happened_at, 1 AS step FROM sessions
+    UNION ALL
+    SELECT role, logout_time AS happened_at, -1 AS step FROM sessions WHERE logout_time IS NOT NULL
+),
+running AS (
+    SELECT role, happened_at,
+           SUM(step) OVER (PARTITION BY role ORDER BY happened_at, step ROWS UNBOUNDED PRECEDING) AS concurrent_sessions
+    FROM events
+),
+peaks AS (
+    SELECT {event_day} AS day, role, MAX(concurrent_sessions) AS peak_concurrent_sessions
+    FROM running
+    WHERE happened_at >= %s AND happened_at < %s
+    GROUP BY 1, 2
+)
+SELECT daily.day, daily.role, daily.daily_active_users, COALESCE(peaks.peak_concurrent_sessions, 0), {percentile_columns}
+FROM daily
+LEFT JOIN peaks ON peaks.day = daily.day AND peaks.role = daily.role
+LEFT JOIN session_lengths ON session_lengths.day = daily.day AND session_lengths.role = daily.role
+ORDER BY daily.day, daily.role
+"""
+
+
+def get_engagement_timeline(start, end):
+    """
+    Daily active users, peak concurrent sessions and session length percentiles (in seconds) per day and role.
+    Everything is computed by the database: concurrency is a running sum over login (+1) and logout (-1) events,
+    open sessions count as active. Users are counted on the day they logged in.
+    """
+    dialect = DIALECTS.get(connection.vendor, DIALECTS['fallback'])
+    sql = ENGAGEMENT_SQL.format(
+        activity_table=connection.ops.quote_name(LoginActivity._meta.db_table),
+        user_table=connection.ops.quote_name(User._meta.db_table),
+        login_day=dialect['day'].format(column='login_time'),
+        event_day=dialect['day'].format(column='happened_at'),
+        duration=dialect['duration'],
+        percentiles=dialect['percentiles'],
+        percentile_source=dialect['percentile_source'],
+        percentile_columns=', '.join(f'session_lengths.p{round(p * 100)}' for p in PERCENTILES),
+    )
+    start, end = (connection.ops.adapt_datetimefield_value(value) for value in (start, end))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [end, start, start, start, end])
+        rows = cursor.fetchall()
+
+    return [
+        {
+            'day': day if isinstance(day, date) else date.fromisoformat(day),
+            'role': role,
+            'daily_active_users': daily_active_users,
+            'peak_concurrent_sessions': peak,
+            **{f'session_length_p{round(p * 100)}': None if value is None else float(value) for p, value in zip(PERCENTILES, lengths)},
+        }
+        for day, role, daily_active_users, peak, *lengths in rows
+    ]
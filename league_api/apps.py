@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LeagueApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'league_api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
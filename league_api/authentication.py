@@ -0,0 +1,94 @@
+from typing import NamedTuple, Optional
+from django.core.cache import caches
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from .cache import record_cache_access
+from .models import User
+
+TOKEN_CACHE_ALIAS = 'auth_tokens'
+# fields kept in the cached snapshot, any other field of request.user is loaded on first access.
+# Model.from_db() expects the values in the order of the model fields.
+SNAPSHOT_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in ('id', 'username', 'email', 'role', 'is_active', 'is_staff', 'is_superuser')
+)
+
+
+
+class Identity(NamedTuple):
+    """Who is calling: loaded once per request so permissions and ownership checks compare ids without queries."""
+    user_id: int
+    role: str
+    team_id: Optional[int] # the team coached by the user
+    player_id: Optional[int]
+
+
+def load_identity(user):
+    team_id, player_id = User.objects.filter(pk=user.pk).values_list('team__id', 'player__id').get()
+    return Identity(user.id, user.role, team_id, player_id)
+
+def get_identity(request):
+    """
+    Return the identity of the authenticated user. Token authentication loads it with the user,
+    other authentication (sessions, forced authentication in tests) loads it on first use, once per request.
+    """
+    identity = getattr(request.auth, 'identity', None) or getattr(request, '_identity', None)
+    if identity is None:
+        identity = request._identity = load_identity(request.user)
+    return identity
+
+def get_token_cache():
+    return caches[TOKEN_CACHE_ALIAS]
+
+def cache_token(key, user, identity):
+    """Store a snapshot of the user under the token key, and the key under the user so it can be invalidated."""
+    token_cache = get_token_cache()
+    token_cache.set_many({
+        f'league:auth:token:{key}': (tuple(getattr(user, field) for field in SNAPSHOT_FIELDS), identity.team_id, identity.player_id),
+        f'league:auth:user:{user.id}': key,
+    })
+
+def invalidate_cached_token(key=None, user_id=None):
+    token_cache = get_token_cache()
+    if key is None and user_id is not None:
+        key = token_cache.get(f'league:auth:user:{user_id}')
+    keys = [f'league:auth:user:{user_id}'] if user_id is not None else []
+    if key is not None:
+        keys.append(f'league:auth:token:{key}')
+    token_cache.delete_many(keys)
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that keeps a snapshot of the user in the `auth_tokens` cache (a bounded LRU with a timeout),
+    so authenticated requests do not query the token and user tables.
+    Every request gets its own User instance built from the snapshot, fields outside SNAPSHOT_FIELDS are deferred.
+    The identity (role, coached team, player) is cached with the user and attached to the token (request.auth).
+    Entries are dropped when the token is deleted (logout), when the user is saved or deleted and when the user gets or
+    loses a team or a player profile. Other processes only see that with a shared cache backend, with a per process cache
+    the timeout bounds how long a token outlives a logout.
+    """
+
+    def authenticate_credentials(self, key):
+        snapshot = get_token_cache().get(f'league:auth:token:{key}')
+        record_cache_access(TOKEN_CACHE_ALIAS, snapshot is not None)
+        if snapshot is None:
+            token = self.get_model().objects.select_related('user').only(
+                'key', *(f'user__{field}' for field in SNAPSHOT_FIELDS)
+            ).annotate(team_id=F('user__team__id'), player_id=F('user__player__id')).filter(key=key).first()
+            if token is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            team_id, player_id = token.team_id, token.player_id
+            token.identity = Identity(token.user.id, token.user.role, team_id, player_id)
+            cache_token(key, token.user, token.identity)
+        else:
+            values, team_id, player_id = snapshot
+            user = User.from_db('default', SNAPSHOT_FIELDS, values)
+            token = self.get_model().from_db('default', ['key', 'user_id'], [key, user.id])
+            token.user = user
+            token.identity = Identity(user.id, user.role, team_id, player_id)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
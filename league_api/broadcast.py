@@ -0,0 +1,109 @@
+import asyncio
+import json
+import threading
+from functools import lru_cache
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+LEAGUE_CHANNEL = 'league'
+
+
+def game_channel(game_id):
+    return f'game:{game_id}'
+
+class Subscription:
+    """
+    A client connection listening to one or more channels.
+    Messages are handed over to the event loop that serves the connection, a slow client drops messages instead of blocking publishers.
+    """
+    def __init__(self, channels, max_queue_size):
+        self.channels = set(channels)
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(max_queue_size)
+
+    def put(self, message):
+        # publishers run in request threads, only the owning loop may touch the queue
+        self._loop.call_soon_threadsafe(self._put_nowait, message)
+
+    def _put_nowait(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class BaseBroadcaster:
+    """
+    Fans live score messages out to subscriptions.
+    A cross process backend (e.g. Redis pub/sub) implements these methods and is selected with the LIVE_SCORES_BROADCASTER setting.
+    """
+    def subscribe(self, channels):
+        raise NotImplementedError('subscribe() must be implemented.')
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError('unsubscribe() must be implemented.')
+
+    def publish(self, channels, message):
+        raise NotImplementedError('publish() must be implemented.')
+
+class InProcessBroadcaster(BaseBroadcaster):
+    """
+    Delivers messages to the subscriptions of the current process only.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, channels):
+        subscription = Subscription(channels, settings.LIVE_SCORES_QUEUE_SIZE)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscriptions.get(channel, set())
+                subscribers.discard(subscription)
+                if not subscribers:
+                    self._subscriptions.pop(channel, None)
+
+    def publish(self, channels, message):
+        with self._lock:
+            # a subscription listening to several of the channels gets the message once
+            subscriptions = set().union(*(self._subscriptions.get(channel, set()) for channel in channels))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+@lru_cache(maxsize=None)
+def get_broadcaster():
+    return import_string(settings.LIVE_SCORES_BROADCASTER)()
+
+def publish_score_update(game_id, changes):
+    """
+    Send the changed fields of a game to the league channel and to the game channel.
+    """
+    get_broadcaster().publish([LEAGUE_CHANNEL, game_channel(game_id)], {'game_id': game_id, **changes})
+
+async def stream_score_events(channels):
+    """
+    Server-sent events for the given channels, with a comment line as keep-alive while nothing happens.
+    """
+    broadcaster = get_broadcaster()
+    subscription = broadcaster.subscribe(channels)
+    try:
+        yield f'retry: {settings.LIVE_SCORES_RETRY_MS}\n\n'
+        while True:
+            message = await subscription.get(timeout=settings.LIVE_SCORES_HEARTBEAT)
+            if message is None:
+                yield ': keep-alive\n\n'
+            else:
+                yield f'event: score\ndata: {json.dumps(message)}\n\n'
+    finally:
+        broadcaster.unsubscribe(subscription)
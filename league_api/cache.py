@@ -0,0 +1,101 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+GAMES_VERSION_KEY = 'league:games:version'
+CACHE_NAMESPACES = ['scoreboard', 'auth_tokens', 'teams', 'players']
+
+
+def get_version(key):
+    """
+    Return the version stored at `key`, the cached payloads it covers are keyed by it.
+    A missing version is seeded from the clock, so it never goes back to a value already used for cached payloads.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+def get_games_version():
+    """Return the league-wide games version, every cached game payload is keyed by it."""
+    return get_version(GAMES_VERSION_KEY)
+
+def bump_games_version():
+    try:
+        cache.incr(GAMES_VERSION_KEY)
+    except ValueError:
+        cache.add(GAMES_VERSION_KEY, time.time_ns(), timeout=None)
+
+def get_scoreboard_cache_key(request):
+    url_hash = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'league:scoreboard:{get_games_version()}:{url_hash}'
+
+def get_cached_scoreboard(cache_key):
+    data = cache.get(cache_key)
+    record_cache_access('scoreboard', data is not None)
+    return data
+
+def set_cached_scoreboard(cache_key, data):
+    cache.set(cache_key, data, timeout=settings.SCOREBOARD_CACHE_TIMEOUT)
+
+def get_object_version_key(namespace, pk):
+    return f'league:object:{namespace}:{pk}:version'
+
+def get_object_cache_key(namespace, pk):
+    """
+    Return the key of the cached representation of a team or a player, keyed by the object version.
+    It must be taken before reading the row, a payload read before a write commits is then stored under the version
+    that write retires.
+    """
+    return f'league:object:{namespace}:{pk}:{get_version(get_object_version_key(namespace, pk))}'
+
+def get_cached_object(namespace, cache_key):
+    """Return the cached representation of a team or a player, None on a miss."""
+    data = cache.get(cache_key)
+    record_cache_access(namespace, data is not None)
+    return data
+
+def set_cached_object(cache_key, data):
+    cache.set(cache_key, data, timeout=settings.OBJECT_CACHE_TIMEOUT)
+
+def invalidate_cached_objects(team_ids=(), player_ids=()):
+    """
+    Move the teams and players to new versions once the transaction that changed them commits, the payloads cached
+    under the previous versions, including those a concurrent request read before the commit, are no longer served.
+    """
+    keys = [get_object_version_key('teams', pk) for pk in team_ids if pk is not None]
+    keys += [get_object_version_key('players', pk) for pk in player_ids if pk is not None]
+    if keys:
+        transaction.on_commit(lambda: cache.set_many(dict.fromkeys(keys, time.time_ns()), timeout=None))
+
+def invalidate_team_payloads(team_ids=(), player_ids=()):
+    """
+    For writes that bypass the model signals: drop the cached teams and players and move the scoreboard pages,
+    which embed the teams with their coach and roster, to a new games version.
+    """
+    invalidate_cached_objects(team_ids, player_ids)
+    transaction.on_commit(bump_games_version)
+
+def record_cache_access(namespace, hit):
+    key = f'league:cache-stats:{namespace}:{"hits" if hit else "misses"}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+def get_cache_stats():
+    stats = {}
+    for namespace in CACHE_NAMESPACES:
+        hits = cache.get(f'league:cache-stats:{namespace}:hits', 0)
+        misses = cache.get(f'league:cache-stats:{namespace}:misses', 0)
+        lookups = hits + misses
+        stats[namespace] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / lookups, 4) if lookups else None,
+        }
+    return stats
@@ -4,6 +4,12 @@ USERS = {
     "PLAYER": "player"
 }
 
+# initial password of the accounts registered by an admin
+DEFAULT_PASSWORDS = {
+    "coach": "coach@123",
+    "player": "player@123"
+}
+
 ERROR_CODES = {
     "COACH_EMAIL_IS_ALREADY_IN_USE": 3000,
     "COACH_USERNAME_IS_ALREADY_IN_USE": 3001,
@@ -27,4 +33,16 @@ ERROR_CODES = {
     "FAILED_TO_UPDATE_AVG_TEAM_SCORE": 3015,
     "FAILED_TO_UPDATE_AVG_PLAYER_SCORE": 3016,
     "FAILED_TO_REMOVE_PLAYER": 3017,
+    "LIVE_SCORES_REQUIRE_ASGI": 3018,
+    "INVALID_EXPORT_FORMAT": 3019,
+    "INVALID_STATISTICS_FILTER": 3020,
+    "INVALID_LEADERBOARD_QUERY": 3021,
+    "INVALID_SCORE_BATCH": 3022,
+    "INVALID_ROSTER_GAME": 3023,
+    "INVALID_REGISTRATION_FILE": 3024,
+    "INVALID_GAME_STATS": 3025,
+    "INVALID_SCORE_EVENTS": 3026,
+    "GAME_CANNOT_BE_FINALIZED": 3027,
+    "GAME_ALREADY_FINALIZED": 3028,
+    "ENGAGEMENT_RANGE_NOT_RETAINED": 3029,
 }
\ No newline at end of file
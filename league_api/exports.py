@@ -0,0 +1,52 @@
+import csv
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import Game, Player, Team, LoginActivity
+
+EXPORTS = {
+    'games': (Game, ['id', 'team1_id', 'team2_id', 'team1_score', 'team2_score', 'winner_id', 'date']),
+    'players': (Player, ['id', 'name', 'user_id', 'team_id', 'height', 'average_score', 'games_played']),
+    'teams': (Team, ['id', 'name', 'coach_id', 'average_score']),
+    'login-activity': (LoginActivity, ['id', 'user_id', 'login_time', 'logout_time']),
+}
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class Echo:
+    """
+    File-like object handing back what the csv writer writes, so rows can be yielded one by one.
+    """
+    def write(self, value):
+        return value
+
+def iter_export_rows(resource, queryset=None):
+    """
+    Stream the exported columns of a resource as tuples in primary key order.
+    Rows are fetched in chunks (through a server-side cursor on PostgreSQL), so memory stays flat for any table size.
+    """
+    model, fields = EXPORTS[resource]
+    if queryset is None:
+        queryset = model.objects.all()
+    return queryset.order_by('pk').values_list(*fields).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+def iter_ndjson(resource, queryset=None):
+    fields = EXPORTS[resource][1]
+    encoder = DjangoJSONEncoder()
+    for row in iter_export_rows(resource, queryset):
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+def iter_csv(resource, queryset=None):
+    fields = EXPORTS[resource][1]
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in iter_export_rows(resource, queryset):
+        yield writer.writerow([value.isoformat() if hasattr(value, 'isoformat') else value for value in row])
+
+def iter_export(resource, export_format, queryset=None):
+    if export_format == 'csv':
+        return iter_csv(resource, queryset)
+    return iter_ndjson(resource, queryset)
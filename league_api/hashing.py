@@ -0,0 +1,14 @@
+import django
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+
+# kept free of model imports, worker processes import it before Django is set up
+
+
+def setup_worker():
+    # forked workers inherit the configured apps, spawned ones set Django up from DJANGO_SETTINGS_MODULE
+    if not apps.ready:
+        django.setup()
+
+def hash_passwords(passwords):
+    return [make_password(password) for password in passwords]
@@ -0,0 +1,91 @@
+import math
+from collections import Counter
+from django.db.models import Count, F, Q, Sum
+from .models import LeaderboardBucket, Player
+
+# width of a histogram bucket is 1 / BUCKETS_PER_POINT, changing it requires `manage.py rebuild_leaderboard`
+BUCKETS_PER_POINT = 10
+
+
+def get_score_bucket(score):
+    """
+    Return the bucket b with b / BUCKETS_PER_POINT <= score < (b + 1) / BUCKETS_PER_POINT.
+    The bounds are computed exactly like the range queries below, so a score never falls between two buckets.
+    """
+    bucket = math.floor(score * BUCKETS_PER_POINT)
+    if bucket / BUCKETS_PER_POINT > score:
+        bucket -= 1
+    elif (bucket + 1) / BUCKETS_PER_POINT <= score:
+        bucket += 1
+    return bucket
+
+def adjust_leaderboard(score, step):
+    """Add (step=1) or remove (step=-1) a player with the given score from the histogram."""
+    bucket = get_score_bucket(score)
+    if step > 0:
+        LeaderboardBucket.objects.bulk_create([LeaderboardBucket(bucket=bucket)], ignore_conflicts=True)
+    LeaderboardBucket.objects.filter(bucket=bucket).update(players=F('players') + step)
+
+def move_leaderboard_score(previous_score, score):
+    if get_score_bucket(previous_score) != get_score_bucket(score):
+        adjust_leaderboard(previous_score, -1)
+        adjust_leaderboard(score, 1)
+
+def rebuild_leaderboard():
+    """Replace the histogram with one counted from the players table."""
+    counts = Counter(
+        get_score_bucket(score)
+        for score in Player.objects.values_list('average_score', flat=True).iterator(chunk_size=2000)
+    )
+    LeaderboardBucket.objects.all().delete()
+    LeaderboardBucket.objects.bulk_create(
+        [LeaderboardBucket(bucket=bucket, players=players) for bucket, players in counts.items()],
+        batch_size=1000,
+    )
+    return counts
+
+def get_score_position(score):
+    """
+    Return (above, below, total): the number of players with a higher and a lower score, and all players.
+    Whole buckets are summed from the histogram, only the bucket of the score is counted on the player index,
+    so the cost depends on the bucket width and the score range, not on the number of players.
+    """
+    bucket = get_score_bucket(score)
+    buckets = LeaderboardBucket.objects.aggregate(
+        above=Sum('players', filter=Q(bucket__gt=bucket), default=0),
+        below=Sum('players', filter=Q(bucket__lt=bucket), default=0),
+        total=Sum('players', default=0),
+    )
+    same_bucket = Player.objects.filter(
+        average_score__gte=bucket / BUCKETS_PER_POINT,
+        average_score__lt=(bucket + 1) / BUCKETS_PER_POINT,
+    ).aggregate(
+        above=Count('id', filter=Q(average_score__gt=score)),
+        below=Count('id', filter=Q(average_score__lt=score)),
+    )
+    return buckets['above'] + same_bucket['above'], buckets['below'] + same_bucket['below'], buckets['total']
+
+def get_player_rank(player):
+    """Competition ranking, players with the same score share a rank."""
+    above, below, total = get_score_position(player.average_score)
+    return {
+        'id': player.id,
+        'name': player.name,
+        'team': player.team_id,
+        'average_score': player.average_score,
+        'rank': above + 1,
+        'percentile': get_percentile(below, total),
+        'total': total,
+    }
+
+def get_percentile(below, total):
+    # share of the players with a lower score
+    return round(100 * below / total, 2) if total else None
+
+def get_top_players(limit):
+    """Read the best players from the score index and rank them, ties share a rank."""
+    players = list(Player.objects.order_by('-average_score', 'id').values('id', 'name', 'team', 'average_score')[:limit])
+    for position, player in enumerate(players):
+        previous = players[position - 1] if position else None
+        player['rank'] = previous['rank'] if previous and previous['average_score'] == player['average_score'] else position + 1
+    return players
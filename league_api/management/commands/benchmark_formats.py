@@ -0,0 +1,40 @@
+import json
+import time
+import msgpack
+from django.core.management.base import BaseCommand
+from league_api.models import Game, Team
+from league_api.renderers import MessagePackRenderer, ORJSONRenderer
+from league_api.representations import GAME_FIELDS, represent_games, represent_teams
+
+
+class Command(BaseCommand):
+    help = 'Compare payload size and encode/decode time of JSON and MessagePack on the scoreboard and team payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=100, help='Encodes and decodes per payload and format')
+
+    def handle(self, *args, **options):
+        payloads = {
+            'scoreboard': represent_games(list(Game.objects.order_by('date', 'id').values(*GAME_FIELDS))),
+            'teams': list(represent_teams(Team.objects.all()).values()),
+        }
+        formats = {
+            'json': (ORJSONRenderer(), json.loads),
+            'msgpack': (MessagePackRenderer(), lambda content: msgpack.unpackb(content, raw=False, timestamp=3)),
+        }
+        repeat = options['repeat']
+
+        self.stdout.write(f'{"payload":<12}{"format":<10}{"bytes":>12}{"encode ms":>12}{"decode ms":>12}')
+        for name, data in payloads.items():
+            for format_name, (renderer, decode) in formats.items():
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    content = renderer.render(data)
+                encoded = time.perf_counter()
+                for _ in range(repeat):
+                    decode(content)
+                decoded = time.perf_counter()
+                self.stdout.write(
+                    f'{name:<12}{format_name:<10}{len(content):>12}'
+                    f'{(encoded - started) * 1000 / repeat:>12.3f}{(decoded - encoded) * 1000 / repeat:>12.3f}'
+                )
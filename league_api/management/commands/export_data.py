@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from league_api.exports import EXPORTS, EXPORT_FORMATS, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Stream a table of the basketball league as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=sorted(EXPORTS))
+        parser.add_argument('--format', dest='export_format', choices=sorted(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--output', help='File to write to, defaults to stdout')
+
+    def handle(self, *args, **options):
+        chunks = iter_export(options['resource'], options['export_format'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            output.writelines(chunks)
+        self.stderr.write(self.style.SUCCESS(f'{options["resource"]} exported to {options["output"]}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from league_api.scoring import fold_score_events
+
+
+class Command(BaseCommand):
+    help = 'Fold the pending live score events into the game totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--game', type=int, action='append', dest='game_ids', help='Only this game, can be repeated')
+
+    def handle(self, *args, **options):
+        totals = fold_score_events(options['game_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Score events folded into {len(totals)} games'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from league_api.leaderboard import rebuild_leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the leaderboard score histogram from the players table'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            counts = rebuild_leaderboard()
+        self.stdout.write(self.style.SUCCESS(f'Leaderboard rebuilt for {sum(counts.values())} players in {len(counts)} buckets'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from league_api.models import Standings
+from league_api.services import compute_standings, rebuild_standings
+
+FIELDS = ['wins', 'losses', 'points_for', 'points_against', 'streak']
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the league standings from the games table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report teams whose stored standings drifted from the games, without writing')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            with transaction.atomic():
+                standings = rebuild_standings()
+            self.stdout.write(self.style.SUCCESS(f'Standings rebuilt for {len(standings)} teams'))
+            return
+
+        expected = compute_standings()
+        stored = {row.pop('team_id'): row for row in Standings.objects.values('team_id', *FIELDS)}
+        drifted = 0
+        for team_id in sorted(set(expected) | set(stored)):
+            want = {field: expected[team_id][field] for field in FIELDS} if team_id in expected else None
+            have = stored.get(team_id)
+            if want != have:
+                drifted += 1
+                self.stdout.write(f'Team {team_id}: stored {have}, expected {want}')
+
+        if drifted:
+            self.stdout.write(self.style.WARNING(f'{drifted} teams drifted'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Standings are consistent'))
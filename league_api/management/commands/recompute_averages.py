@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from league_api.stats import recompute_averages
+
+
+class Command(BaseCommand):
+    help = 'Recompute player and team averages from the player game stat lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--player', type=int, action='append', dest='player_ids', help='Only this player, can be repeated')
+        parser.add_argument('--team', type=int, action='append', dest='team_ids', help='Only this team, can be repeated')
+
+    def handle(self, *args, **options):
+        player_ids, team_ids = options['player_ids'], options['team_ids']
+        # limiting one side only recomputes that side
+        if player_ids and not team_ids:
+            team_ids = []
+        if team_ids and not player_ids:
+            player_ids = []
+        with transaction.atomic():
+            recompute_averages(player_ids, team_ids)
+        self.stdout.write(self.style.SUCCESS('Averages recomputed'))
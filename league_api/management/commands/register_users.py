@@ -0,0 +1,28 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from league_api.registrations import REGISTRATION_FIELDS, register_users
+
+
+class Command(BaseCommand):
+    help = 'Register coaches and players from a CSV file with username, email and role columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header line')
+        parser.add_argument('--batch-size', type=int, help='Rows checked and inserted per batch')
+        parser.add_argument('--workers', type=int, help='Processes hashing passwords, 0 hashes in this process')
+
+    def handle(self, *args, **options):
+        created = failed = 0
+        with open(options['path'], newline='', encoding='utf-8-sig') as source:
+            rows = csv.DictReader(source)
+            if not set(REGISTRATION_FIELDS) <= set(rows.fieldnames or ()):
+                raise CommandError(f'The file must have the columns {", ".join(REGISTRATION_FIELDS)}')
+            for report in register_users(rows, batch_size=options['batch_size'], workers=options['workers']):
+                if report['status'] == 'created':
+                    created += 1
+                    continue
+                failed += 1
+                self.stdout.write(f'Row {report["row"]} ({report["username"]}): {" ".join(report["errors"])}')
+
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style(f'{created} users registered, {failed} rows failed'))
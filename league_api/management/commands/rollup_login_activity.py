@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from league_api.rollups import prune_login_activity, rollup_login_activity
+
+
+class Command(BaseCommand):
+    help = 'Fold closed login sessions into hourly and daily rollups and prune raw rows past the retention window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=settings.LOGIN_ACTIVITY_RETENTION_DAYS,
+                            help='Raw sessions that started earlier than this are pruned once rolled up')
+        parser.add_argument('--archive', help='Append the pruned rows to this NDJSON file before deleting them')
+        parser.add_argument('--no-prune', action='store_true', help='Only fold new sessions into the rollups')
+
+    def handle(self, *args, **options):
+        folded = rollup_login_activity()
+        self.stdout.write(self.style.SUCCESS(f'{folded} sessions rolled up'))
+        if options['no_prune']:
+            return
+
+        if options['archive']:
+            with open(options['archive'], 'a', encoding='utf-8') as archive:
+                pruned = prune_login_activity(options['retention_days'], archive)
+        else:
+            pruned = prune_login_activity(options['retention_days'])
+        self.stdout.write(self.style.SUCCESS(f'{pruned} sessions pruned'))
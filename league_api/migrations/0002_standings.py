@@ -0,0 +1,59 @@
+# Generated by Django 4.2.2 on 2026-10-18 18:21
+
+from collections import defaultdict
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_standings(apps, schema_editor):
+    # compute_standings() at the time of this migration, on the historical models
+    Game = apps.get_model('league_api', 'Game')
+    Standings = apps.get_model('league_api', 'Standings')
+    standings = defaultdict(lambda: {'wins': 0, 'losses': 0, 'points_for': 0, 'points_against': 0, 'streak': 0})
+    closed = set()
+    games = Game.objects.order_by('-date', '-id').values_list('team1', 'team2', 'team1_score', 'team2_score', 'winner')
+    for team1_id, team2_id, team1_score, team2_score, winner_id in games.iterator(chunk_size=2000):
+        for team_id, scored, conceded in ((team1_id, team1_score, team2_score), (team2_id, team2_score, team1_score)):
+            team = standings[team_id]
+            team['points_for'] += scored
+            team['points_against'] += conceded
+            if winner_id is None:
+                continue
+            won = winner_id == team_id
+            team['wins' if won else 'losses'] += 1
+            # games are walked from the most recent one, the streak ends at the first result that breaks it
+            step = 1 if won else -1
+            if team_id not in closed:
+                if team['streak'] and (team['streak'] > 0) != (step > 0):
+                    closed.add(team_id)
+                else:
+                    team['streak'] += step
+    Standings.objects.bulk_create(
+        [Standings(team_id=team_id, **values) for team_id, values in standings.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Standings',
+            fields=[
+                ('team', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='standings', serialize=False, to='league_api.team')),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('losses', models.PositiveIntegerField(default=0)),
+                ('points_for', models.PositiveIntegerField(default=0)),
+                ('points_against', models.PositiveIntegerField(default=0)),
+                ('streak', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-wins', 'losses', 'team'], name='standings_rank_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_standings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.2 on 2026-10-18 18:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_online_sessions(apps, schema_editor):
+    LoginActivity = apps.get_model('league_api', 'LoginActivity')
+    OnlineSession = apps.get_model('league_api', 'OnlineSession')
+    open_activities = LoginActivity.objects.filter(logout_time__isnull=True).values('user').annotate(since=models.Min('login_time'))
+    OnlineSession.objects.bulk_create(
+        [OnlineSession(user_id=row['user'], since=row['since']) for row in open_activities.order_by()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league_api', '0002_standings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OnlineSession',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='online_session', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('since', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(backfill_online_sessions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.2 on 2026-10-18 18:28
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league_api', '0003_online_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoginActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('role', models.CharField(blank=True, max_length=10)),
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('total_duration', models.DurationField(default=datetime.timedelta)),
+                ('max_concurrency', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='loginactivity',
+            name='rolled_up',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='loginactivity',
+            index=models.Index(condition=models.Q(('logout_time__isnull', False), ('rolled_up', False)), fields=['id'], name='loginactivity_pending_idx'),
+        ),
+        migrations.AddField(
+            model_name='loginactivityrollup',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='loginactivityrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('granularity', 'bucket', 'user'), name='unique_user_rollup_bucket'),
+        ),
+        migrations.AddConstraint(
+            model_name='loginactivityrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('granularity', 'role', 'bucket'), name='unique_role_rollup_bucket'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.2 on 2026-10-18 18:32
+
+import math
+from collections import Counter
+from django.db import migrations, models
+
+BUCKETS_PER_POINT = 10
+
+
+def get_score_bucket(score):
+    # leaderboard.get_score_bucket() with the bucket width of this migration
+    bucket = math.floor(score * BUCKETS_PER_POINT)
+    if bucket / BUCKETS_PER_POINT > score:
+        bucket -= 1
+    elif (bucket + 1) / BUCKETS_PER_POINT <= score:
+        bucket += 1
+    return bucket
+
+def backfill_leaderboard(apps, schema_editor):
+    Player = apps.get_model('league_api', 'Player')
+    LeaderboardBucket = apps.get_model('league_api', 'LeaderboardBucket')
+    counts = Counter(get_score_bucket(score) for score in Player.objects.values_list('average_score', flat=True).iterator())
+    LeaderboardBucket.objects.bulk_create(
+        [LeaderboardBucket(bucket=bucket, players=players) for bucket, players in counts.items()],
+        batch_size=1000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league_api', '0004_login_activity_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardBucket',
+            fields=[
+                ('bucket', models.IntegerField(primary_key=True, serialize=False)),
+                ('players', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['-average_score', 'id'], name='player_score_rank_idx'),
+        ),
+        migrations.RunPython(backfill_leaderboard, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.2 on 2026-10-18 18:35
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league_api', '0005_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loginactivity',
+            name='login_time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.2 on 2026-10-18 18:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league_api', '0006_login_time_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameRosterCredit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='league_api.game')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='league_api.team')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='gamerostercredit',
+            constraint=models.UniqueConstraint(fields=('game', 'team'), name='unique_game_roster_credit'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.2 on 2026-10-18 18:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league_api', '0008_player_game_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.SmallIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('folded', models.BooleanField(default=False)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_events', to='league_api.game')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='league_api.team')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('folded', False)), fields=['game'], name='scoreevent_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.2 on 2026-10-18 18:45
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_player_count(apps, schema_editor):
+    Team = apps.get_model('league_api', 'Team')
+    Player = apps.get_model('league_api', 'Player')
+    counts = Player.objects.filter(team=OuterRef('pk')).order_by().values('team').annotate(count=Count('id')).values('count')
+    Team.objects.update(player_count=Coalesce(Subquery(counts), 0))
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league_api', '0009_score_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='player_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_player_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.2 on 2026-10-18 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league_api', '0010_team_player_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['date', 'id'], name='game_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['team1', '-date', '-id'], name='game_team1_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['team2', '-date', '-id'], name='game_team2_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loginactivity',
+            index=models.Index(condition=models.Q(('logout_time__isnull', True)), fields=['user'], name='loginactivity_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['team', '-average_score'], name='player_team_score_idx'),
+        ),
+    ]
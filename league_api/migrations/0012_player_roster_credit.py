@@ -0,0 +1,68 @@
+# Generated by Django 4.2.2 on 2026-10-18 19:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def split_roster_credits(apps, schema_editor):
+    # the roster at the time of a team credit is not recorded, its current players are credited
+    GameRosterCredit = apps.get_model('league_api', 'GameRosterCredit')
+    Player = apps.get_model('league_api', 'Player')
+    rosters = {}
+    for team_id, player_id in Player.objects.values_list('team', 'id').iterator(chunk_size=2000):
+        rosters.setdefault(team_id, []).append(player_id)
+    credits = list(GameRosterCredit.objects.values_list('game', 'team', 'created_at'))
+    GameRosterCredit.objects.all().delete()
+    GameRosterCredit.objects.bulk_create([
+        GameRosterCredit(game_id=game_id, team_id=team_id, player_id=player_id, created_at=created_at)
+        for game_id, team_id, created_at in credits
+        for player_id in rosters.get(team_id, [])
+    ], batch_size=1000)
+
+def merge_roster_credits(apps, schema_editor):
+    GameRosterCredit = apps.get_model('league_api', 'GameRosterCredit')
+    credits = {}
+    for game_id, team_id, created_at in GameRosterCredit.objects.values_list('game', 'player__team', 'created_at'):
+        credits.setdefault((game_id, team_id), created_at)
+    GameRosterCredit.objects.all().delete()
+    GameRosterCredit.objects.bulk_create([
+        GameRosterCredit(game_id=game_id, team_id=team_id, created_at=created_at)
+        for (game_id, team_id), created_at in credits.items()
+    ], batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league_api', '0011_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='gamerostercredit',
+            name='unique_game_roster_credit',
+        ),
+        migrations.AlterField(
+            model_name='gamerostercredit',
+            name='team',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='league_api.team'),
+        ),
+        migrations.AddField(
+            model_name='gamerostercredit',
+            name='player',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='league_api.player'),
+        ),
+        migrations.RunPython(split_roster_credits, merge_roster_credits),
+        migrations.RemoveField(
+            model_name='gamerostercredit',
+            name='team',
+        ),
+        migrations.AlterField(
+            model_name='gamerostercredit',
+            name='player',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='league_api.player'),
+        ),
+        migrations.AddConstraint(
+            model_name='gamerostercredit',
+            constraint=models.UniqueConstraint(fields=('game', 'player'), name='unique_game_player_credit'),
+        ),
+    ]
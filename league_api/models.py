@@ -1,5 +1,7 @@
+from datetime import timedelta
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils.timezone import now
 
 class User(AbstractUser):
     ROLE_CHOICES = (
@@ -17,6 +19,11 @@ class Team(models.Model):
     name = models.CharField(max_length=255)
     coach = models.OneToOneField(User, on_delete=models.CASCADE, related_name='team')
     average_score = models.FloatField(default=0.0)
+    # running totals of the player stat lines, average_score is points per game with stat lines
+    total_points = models.PositiveIntegerField(default=0)
+    scored_games = models.PositiveIntegerField(default=0)
+    # number of players, a slot is reserved by a conditional UPDATE before a player joins
+    player_count = models.PositiveIntegerField(default=0)
 
 class Player(models.Model):
     name = models.CharField(max_length=255)
@@ -25,6 +32,25 @@ class Player(models.Model):
     average_score = models.FloatField(default=0.0)
     games_played = models.PositiveIntegerField(default=0)
     team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='players')
+    # running totals of the stat lines, average_score is points per stat line
+    total_points = models.PositiveIntegerField(default=0)
+    scored_games = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-average_score', 'id'], name='player_score_rank_idx'),
+            # a team's players by score, for the roster percentile filter
+            models.Index(fields=['team', '-average_score'], name='player_team_score_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        player = super().from_db(db, field_names, values)
+        # the stored score lets the leaderboard move the player between buckets when the score is saved
+        player._stored_average_score = player.__dict__.get('average_score')
+        # and the stored team moves the player between team counts
+        player._stored_team_id = player.__dict__.get('team_id')
+        return player
 
 class Game(models.Model):
     team1 = models.ForeignKey(Team, related_name='team1_games', on_delete=models.CASCADE)
@@ -33,12 +59,108 @@ class Game(models.Model):
     team2_score = models.PositiveIntegerField()
     date = models.DateTimeField()
     winner = models.ForeignKey(Team, related_name='wins', on_delete=models.CASCADE,null=True)
-    
+
+    class Meta:
+        indexes = [
+            # scoreboard pages follow the (date, id) cursor
+            models.Index(fields=['date', 'id'], name='game_date_idx'),
+            # the recent games of a team, on either side, for the streaks
+            models.Index(fields=['team1', '-date', '-id'], name='game_team1_date_idx'),
+            models.Index(fields=['team2', '-date', '-id'], name='game_team2_date_idx'),
+        ]
+
 class LoginActivity(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    login_time = models.DateTimeField(auto_now_add=True)
+    login_time = models.DateTimeField(default=now) # not auto_now_add, buffered rows keep the time of the login
     logout_time = models.DateTimeField(null=True, blank=True)
+    rolled_up = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(rolled_up=False, logout_time__isnull=False),
+                         name='loginactivity_pending_idx'),
+            # the open session of a user, closed at logout
+            models.Index(fields=['user'], condition=models.Q(logout_time__isnull=True), name='loginactivity_open_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.email} - {self.login_time}'
-    
\ No newline at end of file
+
+class Standings(models.Model):
+    team = models.OneToOneField(Team, on_delete=models.CASCADE, primary_key=True, related_name='standings')
+    wins = models.PositiveIntegerField(default=0)
+    losses = models.PositiveIntegerField(default=0)
+    points_for = models.PositiveIntegerField(default=0)
+    points_against = models.PositiveIntegerField(default=0)
+    streak = models.IntegerField(default=0) # positive for consecutive wins, negative for consecutive losses
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-wins', 'losses', 'team'], name='standings_rank_idx'),
+        ]
+
+class OnlineSession(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='online_session')
+    since = models.DateTimeField()
+
+class LoginActivityRollup(models.Model):
+    GRANULARITY_CHOICES = (
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    )
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='+') # null for the per-role rollups
+    role = models.CharField(max_length=10, blank=True) # blank for the per-user rollups
+    session_count = models.PositiveIntegerField(default=0)
+    total_duration = models.DurationField(default=timedelta)
+    max_concurrency = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['granularity', 'bucket', 'user'], condition=models.Q(user__isnull=False),
+                                    name='unique_user_rollup_bucket'),
+            models.UniqueConstraint(fields=['granularity', 'role', 'bucket'], condition=models.Q(user__isnull=True),
+                                    name='unique_role_rollup_bucket'),
+        ]
+
+class LeaderboardBucket(models.Model):
+    bucket = models.IntegerField(primary_key=True) # score range [bucket, bucket + 1) / BUCKETS_PER_POINT
+    players = models.PositiveIntegerField(default=0)
+
+class GameRosterCredit(models.Model):
+    """A player was credited with a game played by the roster, at most once per game and player."""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='+')
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'player'], name='unique_game_player_credit'),
+        ]
+
+class PlayerGameStat(models.Model):
+    """Box score line of a player in a game, the team is the one the player played for."""
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='stats')
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='player_stats')
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='+')
+    points = models.PositiveIntegerField(default=0)
+    minutes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['player', 'game'], name='unique_player_game_stat'),
+        ]
+
+class ScoreEvent(models.Model):
+    """Points scored in a live game, appended by the scorekeepers and folded into the game totals."""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='score_events')
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='+')
+    points = models.SmallIntegerField() # negative to correct a previous event
+    created_at = models.DateTimeField(auto_now_add=True)
+    folded = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['game'], condition=models.Q(folded=False), name='scoreevent_pending_idx'),
+        ]
@@ -0,0 +1,22 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ScoreboardCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the scoreboard, ordered by game date with the id as tie breaker.
+    The cursor encodes the last seen position, so every page costs the same as the first one.
+    """
+    ordering = ('date', 'id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class SiteStatisticsCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the users, ordered by id.
+    """
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -1,6 +1,7 @@
 from rest_framework import permissions
 from rest_framework.exceptions import NotAuthenticated
 from rest_framework.permissions import IsAuthenticated
+from .authentication import get_identity
 from .constants import USERS
 
 class IsAdmin(permissions.BasePermission):
@@ -41,11 +42,12 @@ class IsAdminOrIsCoach(permissions.BasePermission):
         return request.user.is_authenticated
     
     def has_object_permission(self, request, view, obj):
+        identity = get_identity(request)
         # Admins can access any team
-        if request.user.role == USERS['ADMIN']:
+        if identity.role == USERS['ADMIN']:
             return True
         # Coaches can only access their own team
-        if request.user.role == USERS['COACH'] and obj.coach == request.user:
+        if identity.role == USERS['COACH'] and obj.pk == identity.team_id:
             return True
         return False
     
\ No newline at end of file
@@ -0,0 +1,126 @@
+import atexit
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from .constants import DEFAULT_PASSWORDS
+from .hashing import hash_passwords, setup_worker
+from .models import User
+
+REGISTRATION_FIELDS = ['username', 'email', 'role']
+
+
+def validate_registration(row, seen_usernames, seen_emails):
+    """Validate a row on its own and against the rows before it, return the list of errors."""
+    errors = []
+    missing = [field for field in REGISTRATION_FIELDS if not row.get(field)]
+    if missing:
+        return [f'Missing {", ".join(missing)}.']
+    if row['role'] not in DEFAULT_PASSWORDS:
+        errors.append(f'Role must be one of {", ".join(DEFAULT_PASSWORDS)}.')
+    try:
+        validate_email(row['email'])
+    except ValidationError:
+        errors.append('Email is not valid.')
+    if row['username'] in seen_usernames:
+        errors.append('Username is duplicated in the file.')
+    if row['email'] in seen_emails:
+        errors.append('Email is duplicated in the file.')
+    return errors
+
+@lru_cache(maxsize=None)
+def get_registration_pool():
+    """The process pool of the API uploads, started by the first upload of the process and reused by the next ones."""
+    pool = ProcessPoolExecutor(max_workers=settings.REGISTRATION_HASH_WORKERS, initializer=setup_worker)
+    atexit.register(pool.shutdown)
+    return pool
+
+def register_users(rows, batch_size=None, workers=None, shared_pool=False):
+    """
+    Register coaches and players from an iterable of dicts with username, email and role, with the default password
+    of the role. Rows are read in batches: each batch is checked for duplicates with one query, its passwords are
+    hashed by a process pool (inline when workers is 0) and the valid users are inserted with bulk_create.
+    The pool is started for the call, or with shared_pool the one of the process sized by REGISTRATION_HASH_WORKERS.
+    Yield a report per row: {'row', 'username', 'status', 'id' or 'errors'}, rows are numbered from 1 after the header.
+    """
+    batch_size = batch_size or settings.REGISTRATION_BATCH_SIZE
+    workers = settings.REGISTRATION_HASH_WORKERS if workers is None or shared_pool else workers
+    if workers == 0:
+        pool = None
+    elif shared_pool:
+        pool = get_registration_pool()
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=setup_worker)
+    seen_usernames, seen_emails = set(), set()
+    rows = enumerate(rows, start=1)
+    try:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield from _register_batch(batch, seen_usernames, seen_emails, pool, workers or os.cpu_count())
+    finally:
+        if pool is not None and not shared_pool:
+            pool.shutdown()
+
+def _register_batch(batch, seen_usernames, seen_emails, pool, pool_size):
+    reports, valid = [], []
+    for number, row in batch:
+        row = {field: (row.get(field) or '').strip() for field in REGISTRATION_FIELDS}
+        errors = validate_registration(row, seen_usernames, seen_emails)
+        seen_usernames.add(row['username'])
+        seen_emails.add(row['email'])
+        reports.append({'row': number, 'username': row['username'], 'status': 'failed', 'errors': errors})
+        if not errors:
+            valid.append((reports[-1], row))
+
+    taken_usernames, taken_emails = set(), set()
+    existing = User.objects.filter(
+        Q(username__in=[row['username'] for _, row in valid]) | Q(email__in=[row['email'] for _, row in valid])
+    )
+    for username, email in existing.values_list('username', 'email'):
+        taken_usernames.add(username)
+        taken_emails.add(email)
+    for report, row in valid:
+        if row['username'] in taken_usernames:
+            report['errors'].append('Username is already in use.')
+        if row['email'] in taken_emails:
+            report['errors'].append('Email is already in use.')
+    valid = [(report, row) for report, row in valid if not report['errors']]
+
+    passwords = [DEFAULT_PASSWORDS[row['role']] for _, row in valid]
+    if pool is None:
+        hashed = hash_passwords(passwords)
+    else:
+        # a few chunks per worker keeps the workers busy without pickling every password on its own
+        chunk = max(1, math.ceil(len(passwords) / (pool_size * 4)))
+        chunks = [passwords[start:start + chunk] for start in range(0, len(passwords), chunk)]
+        hashed = [password for hashed_chunk in pool.map(hash_passwords, chunks) for password in hashed_chunk]
+    users = [User(username=row['username'], email=row['email'], role=row['role'], password=password)
+             for (_, row), password in zip(valid, hashed)]
+
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+    except IntegrityError:
+        # a concurrent registration took a username or an email since the check, insert one by one to find it
+        for user in users:
+            try:
+                with transaction.atomic():
+                    user.save()
+            except IntegrityError:
+                user.pk = None
+    for (report, _), user in zip(valid, users):
+        if user.pk is None:
+            report['errors'].append('Username or email is already in use.')
+            continue
+        report['status'] = 'created'
+        report['id'] = user.pk
+        del report['errors']
+    return reports
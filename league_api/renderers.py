@@ -0,0 +1,50 @@
+import json
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets clients negotiate text/event-stream, responses that are not streamed (errors) are sent as a single error event.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return f'event: error\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n'.encode(self.charset)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    application/json rendered with orjson, compact and UTF-8 like the default renderer settings.
+    Values orjson does not know (lazy strings, decimals, durations...) are converted by the DRF encoder,
+    the browsable API keeps its indented output.
+    """
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        # datetimes are passed to the encoder as well, DRF renders UTC with a Z suffix
+        return orjson.dumps(data, default=self.encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    application/msgpack for high volume clients. Values are the ones of the JSON output,
+    datetimes and durations not converted by a serializer go through the DRF encoder as well.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self.encoder.default, datetime=False)
@@ -0,0 +1,62 @@
+from collections import defaultdict
+from rest_framework import serializers
+from .models import Player, Team
+
+# read-only fast path: the default representations of the list and detail endpoints built from .values() rows,
+# the output is the one of the model serializers without ?fields= or ?expand=, which fall back to them
+USER_FIELDS = ['id', 'username', 'email', 'role', 'login_count', 'total_time_spent']
+PLAYER_FIELDS = ['id', 'name', 'height', 'average_score', 'games_played', 'team']
+GAME_FIELDS = ['id', 'team1', 'team2', 'team1_score', 'team2_score', 'winner', 'date']
+
+datetime_field = serializers.DateTimeField()
+duration_field = serializers.DurationField()
+
+
+def is_default_representation(request):
+    return 'fields' not in request.query_params and 'expand' not in request.query_params
+
+def represent_player(row):
+    return {field: row[field] for field in PLAYER_FIELDS}
+
+def represent_teams(teams):
+    """
+    Return {team_id: TeamSerializer output} for a Team queryset, with its coach and roster, in three queries at most.
+    """
+    rows = list(teams.values('id', 'name', 'average_score', *(f'coach__{field}' for field in USER_FIELDS)))
+    if not rows:
+        return {}
+    rosters = defaultdict(list)
+    for row in Player.objects.filter(team_id__in=[row['id'] for row in rows]).order_by('pk').values(*PLAYER_FIELDS):
+        rosters[row['team']].append(represent_player(row))
+
+    represented = {}
+    for row in rows:
+        coach = {field: row[f'coach__{field}'] for field in USER_FIELDS}
+        coach['total_time_spent'] = duration_field.to_representation(coach['total_time_spent'])
+        represented[row['id']] = {
+            'id': row['id'],
+            'name': row['name'],
+            'coach': coach,
+            'players': rosters[row['id']],
+            'average_score': row['average_score'],
+        }
+    return represented
+
+def represent_games(rows):
+    """
+    Return the GameSerializer output of Game .values(*GAME_FIELDS) rows, the teams of all games are read at once.
+    """
+    team_ids = {row[side] for row in rows for side in ('team1', 'team2', 'winner') if row[side] is not None}
+    teams = represent_teams(Team.objects.filter(id__in=team_ids)) if team_ids else {}
+    return [
+        {
+            'id': row['id'],
+            'team1': teams[row['team1']],
+            'team2': teams[row['team2']],
+            'team1_score': row['team1_score'],
+            'team2_score': row['team2_score'],
+            'winner': None if row['winner'] is None else {'id': row['winner'], 'name': teams[row['winner']]['name']},
+            'date': datetime_field.to_representation(row['date']),
+        }
+        for row in rows
+    ]
@@ -0,0 +1,111 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils.timezone import now
+from .exports import iter_ndjson
+from .models import LoginActivity, LoginActivityRollup
+
+GRANULARITIES = {
+    'hour': TruncHour,
+    'day': TruncDay,
+}
+SESSION_DURATION = ExpressionWrapper(F('logout_time') - F('login_time'), output_field=DurationField())
+
+
+def get_max_concurrency(intervals):
+    """
+    Sweep over (login_time, logout_time) intervals and return the highest number of overlapping sessions.
+    """
+    events = sorted([(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals],
+                    key=lambda event: (event[0], event[1]))
+    current = peak = 0
+    for _, step in events:
+        current += step
+        peak = max(peak, current)
+    return peak
+
+def rollup_login_activity(batch_size=10000):
+    """
+    Fold closed sessions that were not rolled up yet into hourly and daily rollups, per user and per role.
+    Sessions are attributed to the bucket they started in and flagged as rolled up in the same transaction, so a run
+    can be repeated at any time and sessions that arrive late are still folded exactly once.
+    The max concurrency of a bucket is computed over the sessions folded in the same batch and merged with max(),
+    so it is a lower bound when a bucket is folded over several batches.
+    """
+    folded = 0
+    while True:
+        with transaction.atomic():
+            # a concurrent run waits for these rows and no longer sees them as pending once this batch commits
+            pending = LoginActivity.objects.select_for_update().filter(rolled_up=False, logout_time__isnull=False)
+            ids = list(pending.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return folded
+            sessions = LoginActivity.objects.filter(id__in=ids)
+
+            for granularity, trunc in GRANULARITIES.items():
+                bucketed = sessions.annotate(bucket=trunc('login_time'))
+                rollups = {}
+                for row in bucketed.values('bucket', 'user').annotate(session_count=Count('id'), total_duration=Sum(SESSION_DURATION)).order_by():
+                    rollups[(row['bucket'], row['user'], '')] = row
+                for row in bucketed.values('bucket', 'user__role').annotate(session_count=Count('id'), total_duration=Sum(SESSION_DURATION)).order_by():
+                    rollups[(row['bucket'], None, row['user__role'])] = row
+
+                intervals = defaultdict(list)
+                for bucket, user_id, role, login_time, logout_time in bucketed.values_list('bucket', 'user', 'user__role', 'login_time', 'logout_time'):
+                    intervals[(bucket, user_id, '')].append((login_time, logout_time))
+                    intervals[(bucket, None, role)].append((login_time, logout_time))
+
+                _merge_rollups(granularity, rollups, intervals)
+
+            sessions.update(rolled_up=True)
+        folded += len(ids)
+
+def _merge_rollups(granularity, rollups, intervals):
+    buckets = {key[0] for key in rollups}
+    existing = {
+        (rollup.bucket, rollup.user_id, rollup.role): rollup
+        for rollup in LoginActivityRollup.objects.filter(granularity=granularity, bucket__in=buckets)
+    }
+    created, updated = [], []
+    for key, row in rollups.items():
+        concurrency = get_max_concurrency(intervals[key])
+        rollup = existing.get(key)
+        if rollup is None:
+            created.append(LoginActivityRollup(
+                granularity=granularity, bucket=key[0], user_id=key[1], role=key[2],
+                session_count=row['session_count'], total_duration=row['total_duration'], max_concurrency=concurrency,
+            ))
+            continue
+        rollup.session_count += row['session_count']
+        rollup.total_duration += row['total_duration']
+        rollup.max_concurrency = max(rollup.max_concurrency, concurrency)
+        updated.append(rollup)
+
+    LoginActivityRollup.objects.bulk_create(created, batch_size=1000)
+    LoginActivityRollup.objects.bulk_update(updated, ['session_count', 'total_duration', 'max_concurrency'], batch_size=1000)
+
+def prune_login_activity(retention_days, archive=None):
+    """
+    Delete closed sessions that started before the retention window and were already folded into the rollups.
+    When `archive` is a writable text file, the pruned rows are written to it as NDJSON first.
+    """
+    expired = LoginActivity.objects.filter(rolled_up=True, login_time__lt=now() - timedelta(days=retention_days))
+    if archive is not None:
+        archive.writelines(iter_ndjson('login-activity', expired))
+    deleted, _ = expired.delete()
+    return deleted
+
+def get_activity_rollups(granularity, start=None, end=None, role=None):
+    """
+    Read the per-role rollups, the cost depends on the number of buckets in the range, not on the number of logins.
+    """
+    rollups = LoginActivityRollup.objects.filter(granularity=granularity, user__isnull=True)
+    if start is not None:
+        rollups = rollups.filter(bucket__gte=start)
+    if end is not None:
+        rollups = rollups.filter(bucket__lt=end)
+    if role is not None:
+        rollups = rollups.filter(role=role)
+    return rollups.order_by('bucket', 'role').values('bucket', 'role', 'session_count', 'total_duration', 'max_concurrency')
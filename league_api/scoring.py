@@ -0,0 +1,73 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from .broadcast import publish_score_update
+from .cache import bump_games_version
+from .models import Game, ScoreEvent
+from .services import get_game_result, update_standings_for_games
+from .stats import per_row
+
+
+def fold_score_events(game_ids=None, skip_locked=False):
+    """
+    Add the pending score events of the games (all games when None) to their totals with one atomic UPDATE
+    and flag them as folded, in the same transaction. Folding a game is serialized on its row: with `skip_locked`
+    the games being folded elsewhere are skipped and their events stay pending for the next run.
+    A total never goes below zero. Return {game_id: (team1_score, team2_score)} of the folded games.
+    """
+    with transaction.atomic():
+        pending = ScoreEvent.objects.filter(folded=False)
+        if game_ids is not None:
+            pending = pending.filter(game_id__in=game_ids)
+        games = Game.objects.select_for_update(skip_locked=skip_locked).filter(
+            id__in=pending.values('game_id')
+        ).only('team1', 'team2', 'team1_score', 'team2_score', 'winner').in_bulk()
+        if not games:
+            return {}
+
+        # read after the games are locked, events of a game committed by a concurrent fold are no longer pending
+        events = list(ScoreEvent.objects.filter(folded=False, game_id__in=games).values_list('id', 'game_id', 'team_id', 'points'))
+        deltas = defaultdict(lambda: [0, 0])
+        for _, game_id, team_id, points in events:
+            deltas[game_id][0 if team_id == games[game_id].team1_id else 1] += points
+
+        Game.objects.filter(id__in=deltas).update(
+            team1_score=Greatest(F('team1_score') + per_row((game_id, delta[0]) for game_id, delta in deltas.items()), Value(0)),
+            team2_score=Greatest(F('team2_score') + per_row((game_id, delta[1]) for game_id, delta in deltas.items()), Value(0)),
+        )
+        results, totals = [], {}
+        for game_id, (team1_delta, team2_delta) in deltas.items():
+            game = games[game_id]
+            previous_result = get_game_result(game)
+            game.team1_score = max(game.team1_score + team1_delta, 0)
+            game.team2_score = max(game.team2_score + team2_delta, 0)
+            results.append((previous_result, game))
+            totals[game_id] = (game.team1_score, game.team2_score)
+        update_standings_for_games(results)
+        ScoreEvent.objects.filter(id__in=[event[0] for event in events]).update(folded=True)
+
+        # update() does not send post_save, the cached game payloads are invalidated here
+        transaction.on_commit(bump_games_version)
+        transaction.on_commit(lambda: [
+            publish_score_update(game_id, {'team1_score': team1_score, 'team2_score': team2_score})
+            for game_id, (team1_score, team2_score) in totals.items()
+        ])
+    return totals
+
+def finalize_game(game_id):
+    """
+    Fold the pending events of a game and set the team with the higher total as the winner.
+    Return the game, None when it does not exist, is already finalized or is tied.
+    """
+    with transaction.atomic():
+        fold_score_events([game_id])
+        game = Game.objects.select_for_update().filter(id=game_id, winner__isnull=True).first()
+        if game is None or game.team1_score == game.team2_score:
+            return None
+        previous_result = get_game_result(game)
+        game.winner_id = game.team1_id if game.team1_score > game.team2_score else game.team2_id
+        game.save(update_fields=['winner'])
+        update_standings_for_games([(previous_result, game)])
+        transaction.on_commit(lambda: publish_score_update(game.id, {'winner': game.winner_id}))
+    return game
@@ -1,7 +1,123 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import User, Team, Player, Game
+from .models import User, Team, Player, Game, Standings
 
-class UserSerializer(serializers.ModelSerializer):
+UNSET = object()
+
+
+def parse_field_tree(value):
+    """
+    Turn a comma separated list of dotted paths into a tree,
+    e.g. 'id,team1.name,team1.players' into {'id': {}, 'team1': {'name': {}, 'players': {}}}.
+    """
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in filter(None, (part.strip() for part in path.split('.'))):
+            node = node.setdefault(name, {})
+    return tree or None
+
+class DynamicFieldsMixin:
+    """
+    Sparse fieldsets (?fields=) and opt-in expansion of relations (?expand=), both accept dotted paths for nested serializers.
+    `expandable_fields` maps a relation to the serializer that renders it when expanded, a collapsed relation is rendered as primary key(s).
+    Without ?expand= the relations listed in `default_expand` are expanded, which keeps the default payload unchanged.
+    """
+    expandable_fields = {}
+    default_expand = []
+
+    def __init__(self, *args, fields=UNSET, expand=UNSET, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        # only the top level serializer reads the query string, nested ones receive their part of the trees
+        if fields is UNSET:
+            fields = parse_field_tree(request.query_params.get('fields', '')) if request else None
+        if expand is UNSET:
+            expand = None
+            if request and 'expand' in request.query_params:
+                # an empty ?expand= collapses every relation
+                expand = parse_field_tree(request.query_params['expand']) or {}
+        self.field_tree = fields
+        self.expand_tree = expand
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.field_tree is not None:
+            for name in list(fields):
+                if name not in self.field_tree:
+                    fields.pop(name)
+
+        expanded = self.default_expand if self.expand_tree is None else self.expand_tree
+        for name, (serializer_class, options) in self.expandable_fields.items():
+            if name in fields and name in expanded:
+                fields[name] = serializer_class(
+                    fields=(self.field_tree or {}).get(name) or None,
+                    expand=None if self.expand_tree is None else self.expand_tree[name],
+                    **options
+                )
+        return fields
+
+    def optimize_queryset(self, queryset, required_fields=()):
+        """
+        Restrict a queryset to the joins, prefetches and columns this serializer renders.
+        `required_fields` are loaded as well, e.g. the fields a paginator orders by.
+        """
+        select_related, prefetch_related, only = self.get_query_plan()
+        queryset = queryset.select_related(*select_related).prefetch_related(*prefetch_related)
+        if only is None:
+            return queryset
+        return queryset.only(*only, *required_fields)
+
+    def get_query_plan(self, prefix=''):
+        """
+        Return the (select_related, prefetch_related, only) lookups needed to render this serializer.
+        `only` is None when a field is not backed by a model column and the columns can not be restricted.
+        """
+        model = self.Meta.model
+        select_related, prefetch_related, only = [], [], [prefix + model._meta.pk.name]
+        for field in self.fields.values():
+            if field.source == '*':
+                only = None
+                continue
+            path = field.source.split('.')
+            lookup = prefix + '__'.join(path)
+            try:
+                model_field = model._meta.get_field(path[0])
+            except FieldDoesNotExist:
+                only = None
+                continue
+
+            if isinstance(field, serializers.ListSerializer):
+                child = field.child
+                child_queryset = child.optimize_queryset(child.Meta.model.objects.order_by('pk'), self._get_remote_fields(model_field))
+                prefetch_related.append(Prefetch(lookup, queryset=child_queryset))
+            elif isinstance(field, serializers.ManyRelatedField):
+                related_queryset = model_field.related_model.objects.order_by('pk').only('pk', *self._get_remote_fields(model_field))
+                prefetch_related.append(Prefetch(lookup, queryset=related_queryset))
+            elif isinstance(field, serializers.BaseSerializer):
+                child_select, child_prefetch, child_only = field.get_query_plan(lookup + '__')
+                select_related += [lookup] + child_select
+                prefetch_related += child_prefetch
+                if only is not None:
+                    only = None if child_only is None else only + [lookup] + child_only
+            elif len(path) > 1:
+                # dotted sources such as team.name follow forward relations
+                select_related.append(prefix + '__'.join(path[:-1]))
+                if only is not None:
+                    only.append(lookup)
+            elif only is not None:
+                only.append(lookup)
+        return select_related, prefetch_related, only
+
+    @staticmethod
+    def _get_remote_fields(model_field):
+        # a reverse foreign key is prefetched through the foreign key on the related rows
+        if model_field.one_to_many:
+            return [model_field.field.name]
+        return []
+
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'role', 'login_count', 'total_time_spent']
@@ -11,36 +127,85 @@ class RegisterUserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'email', 'role']
 
-class WinnerSerializer(serializers.ModelSerializer):
+class WinnerSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Team
         fields = ['id', 'name']
 
-class PlayerSerializer(serializers.ModelSerializer):
+class PlayerSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'team': (WinnerSerializer, {}),
+    }
+
     class Meta:
         model = Player
         fields = ['id', 'name', 'height', 'average_score', 'games_played', 'team']
 
-class TeamSerializer(serializers.ModelSerializer):
-    coach = UserSerializer()
-    players = PlayerSerializer(many=True)
+class TeamSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'coach': (UserSerializer, {}),
+        'players': (PlayerSerializer, {'many': True}),
+    }
+    default_expand = ['coach', 'players']
 
     class Meta:
         model = Team
         fields = ['id', 'name', 'coach', 'players','average_score']
 
-class InitialTeamSerializer(serializers.ModelSerializer):
-    players = PlayerSerializer(many=True)
+class InitialTeamSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'coach': (UserSerializer, {}),
+        'players': (PlayerSerializer, {'many': True}),
+    }
+    default_expand = ['players']
 
     class Meta:
         model = Team
         fields = ['id', 'name', 'coach', 'players','average_score']
 
-class GameSerializer(serializers.ModelSerializer):
-    team1 = TeamSerializer()
-    team2 = TeamSerializer()
-    winner = WinnerSerializer()
+class GameSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'team1': (TeamSerializer, {}),
+        'team2': (TeamSerializer, {}),
+        'winner': (WinnerSerializer, {}),
+    }
+    default_expand = ['team1', 'team2', 'winner']
 
     class Meta:
         model = Game
         fields = ['id', 'team1', 'team2', 'team1_score', 'team2_score', 'winner', 'date']
+
+class StandingsSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    team_name = serializers.CharField(source='team.name')
+
+    class Meta:
+        model = Standings
+        fields = ['team', 'team_name', 'wins', 'losses', 'points_for', 'points_against', 'streak']
+
+class GameScoreUpdateSerializer(serializers.Serializer):
+    game_id = serializers.IntegerField()
+    team1_score = serializers.IntegerField(min_value=0, required=False)
+    team2_score = serializers.IntegerField(min_value=0, required=False)
+
+class PlayerGameStatSerializer(serializers.Serializer):
+    player_id = serializers.IntegerField()
+    points = serializers.IntegerField(min_value=0)
+    minutes = serializers.IntegerField(min_value=0, default=0)
+
+class GameStatsSerializer(serializers.Serializer):
+    game_id = serializers.IntegerField()
+    stats = PlayerGameStatSerializer(many=True, allow_empty=False)
+
+class ScoreEventSerializer(serializers.Serializer):
+    game_id = serializers.IntegerField()
+    team_id = serializers.IntegerField()
+    # a basket, a free throw or the correction of one
+    points = serializers.IntegerField(min_value=-3, max_value=3)
+
+    def validate_points(self, value):
+        if value == 0:
+            raise serializers.ValidationError('Ensure this value is not zero.')
+        return value
+
+class ScoreEventBatchSerializer(serializers.Serializer):
+    events = ScoreEventSerializer(many=True, allow_empty=False, max_length=500)
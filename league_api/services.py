@@ -1,42 +1,247 @@
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Aggregate, Case, Count, Exists, F, OuterRef, Q, Subquery, Sum, Value, When, Window
+from django.db.models.functions import CumeDist
 from django.utils.timezone import now
-from .models import User, LoginActivity
-
-def get_site_statistics():
-    users = User.objects.all()
-    data = []
-    for user in users:
-        last_login_activity = LoginActivity.objects.filter(user=user).last()
-        is_online = last_login_activity and not last_login_activity.logout_time
-        data.append({
-            'id': user.id,
-            'username': user.username,
-            'login_count': user.login_count,
-            'total_time_spent': user.total_time_spent,
-            'is_online': is_online
-        })
-    return data
-
-def calculate_90th_percentile(scores):
-    try:
-        if scores:
-            scores.sort()
-            percentile_index = int(len(scores) * 0.9) - 1
-            return scores[percentile_index]
-    except:
-        return None
-    return None
-
-def update_login_count_and_activity(user):
-    user.login_count += 1
-    user.save()
-    LoginActivity.objects.create(user=user, login_time=now())
-
-def record_logout_and_calculate_time_spent(user):
-    login_activity = LoginActivity.objects.filter(user=user, logout_time__isnull=True).first()
+from .models import User, LoginActivity, Game, Standings, OnlineSession, Player, GameRosterCredit, PlayerGameStat, Team
+from .cache import invalidate_team_payloads
+from .telemetry import flush_login_activity, record_login_activity
+
+def get_site_statistics(role=None, is_online=None, min_login_count=None):
+    """
+    Return the statistics of the users as a single annotated query.
+    A user is online from the login to the logout, as recorded by the presence table.
+    """
+    users = User.objects.annotate(is_online=Exists(OnlineSession.objects.filter(user=OuterRef('pk'))))
+
+    if role is not None:
+        users = users.filter(role=role)
+    if is_online is not None:
+        users = users.filter(is_online=is_online)
+    if min_login_count is not None:
+        users = users.filter(login_count__gte=min_login_count)
+    return users.values('id', 'username', 'login_count', 'total_time_spent', 'is_online')
+
+class PercentileDisc(Aggregate):
+    """
+    PostgreSQL ordered-set aggregate returning the first value whose cumulative distribution reaches the fraction.
+    """
+    function = 'PERCENTILE_DISC'
+    template = '%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=float(fraction), **extra)
+
+def filter_by_percentile(queryset, field, percentile):
+    """
+    Keep the rows whose `field` reaches the given percentile (0-100) of the queryset, in a single query.
+    PostgreSQL compares against a PERCENTILE_DISC subquery, other databases filter on CUME_DIST(),
+    both select the values at or above the nearest-rank percentile.
+    """
+    fraction = percentile / 100
+    if connection.vendor == 'postgresql':
+        threshold = queryset.order_by().annotate(
+            percentile_group=Value(1)
+        ).values('percentile_group').annotate(
+            threshold=PercentileDisc(field, fraction)
+        ).values('threshold')
+        return queryset.filter(**{f'{field}__gte': Subquery(threshold)})
+
+    return queryset.annotate(
+        cumulative_distribution=Window(CumeDist(), order_by=F(field).asc())
+    ).filter(cumulative_distribution__gte=fraction)
+
+def update_login_count_and_activity(user, team_id=None):
+    """
+    Count the login with an atomic update of the counter column and buffer the login activity row.
+    The login_count of the given instance is not refreshed. `team_id` is the team coached by the user,
+    its cached payloads embed the counters.
+    """
+    login_time = now()
+    User.objects.filter(pk=user.pk).update(login_count=F('login_count') + 1)
+    if team_id is not None:
+        invalidate_team_payloads(team_ids=[team_id])
+    # before the activity row, a flush only writes the rows of users who are still online
+    OnlineSession.objects.get_or_create(user=user, defaults={'since': login_time})
+    record_login_activity(user, login_time)
+
+def record_logout_and_calculate_time_spent(user, team_id=None):
+    """
+    Close the user's open session and add its duration to total_time_spent, both with conditional/atomic updates
+    so concurrent logouts neither close a session twice nor lose time. `team_id` is the team coached by the user.
+    """
+    # the session to close may still be in the write-behind buffer
+    flush_login_activity()
+    login_activity = LoginActivity.objects.filter(user=user, logout_time__isnull=True).only('login_time').first()
+    closed = False
     if login_activity:
         login_activity.logout_time = now()
-        login_activity.save()
+        closed = LoginActivity.objects.filter(pk=login_activity.pk, logout_time__isnull=True).update(logout_time=login_activity.logout_time)
+    else:
+        # the login is still buffered by another process: the session is recorded from the presence table,
+        # that process drops the buffered row once the user is offline. Deleting the presence row claims the logout.
+        online_session = OnlineSession.objects.filter(user=user).first()
+        if online_session and OnlineSession.objects.filter(user=user, since=online_session.since).delete()[0]:
+            login_activity = LoginActivity.objects.create(user=user, login_time=online_session.since, logout_time=now())
+            closed = True
+    if closed:
         session_duration = login_activity.logout_time - login_activity.login_time
-        user.total_time_spent += session_duration
-        user.save()
+        User.objects.filter(pk=user.pk).update(total_time_spent=F('total_time_spent') + session_duration)
+        if team_id is not None:
+            invalidate_team_payloads(team_ids=[team_id])
+    # the token shared by all sessions of the user is deleted on logout, so the user is offline
+    OnlineSession.objects.filter(user=user).delete()
     return login_activity
+
+def get_online_users():
+    """
+    Return the users currently online, read from the presence table so the cost follows the number of online users.
+    """
+    sessions = OnlineSession.objects.select_related('user').only('since', 'user__id', 'user__username', 'user__role')
+    return [
+        {'id': session.user.id, 'username': session.user.username, 'role': session.user.role, 'since': session.since}
+        for session in sessions.order_by('since')
+    ]
+
+def get_game_result(game):
+    """
+    Return the standings contribution of a game as {team_id: (wins, losses, points_for, points_against)}.
+    Points follow the live scores, a win or a loss is only counted once the winner is set (the game is finalized).
+    """
+    winner_id = game.winner_id
+
+    result = {}
+    for team_id, scored, conceded in ((game.team1_id, game.team1_score, game.team2_score),
+                                      (game.team2_id, game.team2_score, game.team1_score)):
+        won = int(winner_id == team_id)
+        lost = int(winner_id is not None and not won)
+        result[team_id] = (won, lost, scored, conceded)
+    return result
+
+def calculate_streaks(team_ids=None):
+    """
+    Walk the games of the teams (all teams when None) from the most recent one in a single ordered pass and count
+    consecutive results. Games without a winner are skipped, a team is done at the first result that breaks its streak.
+    """
+    streaks = defaultdict(int)
+    closed = set()
+    games = Game.objects.filter(winner__isnull=False).order_by('-date', '-id').only('team1', 'team2', 'team1_score', 'team2_score', 'winner')
+    if team_ids is not None:
+        team_ids = set(team_ids)
+        streaks.update(dict.fromkeys(team_ids, 0))
+        games = games.filter(Q(team1_id__in=team_ids) | Q(team2_id__in=team_ids))
+    for game in games.iterator(chunk_size=2000):
+        for team_id, (won, lost, _, _) in get_game_result(game).items():
+            if team_id in closed or not (won or lost) or (team_ids is not None and team_id not in team_ids):
+                continue
+            step = 1 if won else -1
+            if streaks[team_id] and (streaks[team_id] > 0) != (step > 0):
+                closed.add(team_id)
+                continue
+            streaks[team_id] += step
+        if team_ids is not None and closed >= team_ids:
+            break
+    return streaks
+
+def update_standings(previous_result, game):
+    """
+    Move the standings of both teams from a previous game result to the current one.
+    Must be called inside the transaction that saved the game.
+    """
+    update_standings_for_games([(previous_result, game)])
+
+def update_standings_for_games(results):
+    """
+    Move the standings of every team in `results`, a list of (previous_result, game), with a single UPDATE.
+    Must be called inside the transaction that saved the games.
+    """
+    deltas = defaultdict(lambda: [0, 0, 0, 0])
+    for previous_result, game in results:
+        for sign, result in ((-1, previous_result or {}), (1, get_game_result(game))):
+            for team_id, values in result.items():
+                for index, value in enumerate(values):
+                    deltas[team_id][index] += sign * value
+    if not deltas:
+        return
+
+    def per_team(values):
+        return Case(*(When(team_id=team_id, then=Value(value)) for team_id, value in values), default=Value(0))
+
+    Standings.objects.bulk_create([Standings(team_id=team_id) for team_id in deltas], ignore_conflicts=True)
+    streaks = calculate_streaks(deltas)
+    Standings.objects.filter(team_id__in=deltas).update(
+        **{
+            field: F(field) + per_team((team_id, delta[index]) for team_id, delta in deltas.items())
+            for index, field in enumerate(('wins', 'losses', 'points_for', 'points_against'))
+        },
+        streak=per_team(streaks.items()),
+    )
+
+def credit_roster_games_played(game_id, team_id, player_ids=None):
+    """
+    Increment games_played of the team's roster, or of the players in `player_ids`, once per game and player
+    with a single UPDATE. Return the number of credited players, None when all of them were already credited for the game.
+    """
+    with transaction.atomic():
+        # the locked players serialize concurrent credits and stat lines of the same players
+        players = Player.objects.select_for_update().filter(team_id=team_id).order_by('pk')
+        if player_ids is not None:
+            players = players.filter(id__in=player_ids)
+        players = list(players.values_list('id', flat=True))
+        credited = set(GameRosterCredit.objects.filter(game_id=game_id, player_id__in=players).values_list('player_id', flat=True))
+        # players with a stat line for the game were credited by it
+        scored = set(PlayerGameStat.objects.filter(game_id=game_id, player_id__in=players).values_list('player_id', flat=True))
+        new_players = [player_id for player_id in players if player_id not in credited and player_id not in scored]
+        if credited and not new_players:
+            return None
+        GameRosterCredit.objects.bulk_create([GameRosterCredit(game_id=game_id, player_id=player_id) for player_id in new_players])
+        Player.objects.filter(id__in=new_players).update(games_played=F('games_played') + 1)
+        invalidate_team_payloads(team_ids=[team_id], player_ids=new_players)
+        return len(new_players)
+
+def reserve_team_slot(team_id):
+    """
+    Take a slot of the team with a single conditional UPDATE, the row lock of the UPDATE serializes concurrent joins
+    and the cap is checked against the committed count. Return False when the team is full or does not exist.
+    The player created in the same transaction must be flagged with `_slot_reserved` so it is not counted twice.
+    """
+    return Team.objects.filter(id=team_id, player_count__lt=settings.TEAM_MAX_PLAYERS).update(player_count=F('player_count') + 1) == 1
+
+def move_team_slot(team_id, step):
+    """Add (step=1) or release (step=-1) a slot of the team, regardless of the cap."""
+    Team.objects.filter(id=team_id).update(player_count=F('player_count') + step)
+
+def compute_standings():
+    """
+    Compute the standings of every team that played from scratch.
+    Totals come from one grouped query per side of the game, streaks from a single ordered pass over the games.
+    """
+    standings = defaultdict(lambda: {'wins': 0, 'losses': 0, 'points_for': 0, 'points_against': 0, 'streak': 0})
+    for side, other in (('team1', 'team2'), ('team2', 'team1')):
+        rows = Game.objects.values(side).annotate(
+            wins=Count('id', filter=Q(winner=F(side))),
+            losses=Count('id', filter=Q(winner=F(other))),
+            points_for=Sum(f'{side}_score'),
+            points_against=Sum(f'{other}_score'),
+        ).order_by()
+        for row in rows:
+            team = standings[row[side]]
+            for key in ('wins', 'losses', 'points_for', 'points_against'):
+                team[key] += row[key]
+
+    for team_id, streak in calculate_streaks().items():
+        standings[team_id]['streak'] = streak
+    return standings
+
+def rebuild_standings():
+    """Replace the standings table with freshly computed values."""
+    standings = compute_standings()
+    Standings.objects.exclude(team_id__in=standings.keys()).delete()
+    Standings.objects.bulk_create(
+        [Standings(team_id=team_id, **values) for team_id, values in standings.items()],
+        update_conflicts=True,
+        unique_fields=['team'],
+        update_fields=['wins', 'losses', 'points_for', 'points_against', 'streak'],
+    )
+    return standings
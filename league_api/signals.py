@@ -0,0 +1,109 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .authentication import invalidate_cached_token
+from .cache import bump_games_version, invalidate_cached_objects
+from .leaderboard import adjust_leaderboard, move_leaderboard_score
+from .services import move_team_slot
+from .models import Game, Player, Team, User
+
+
+# any write to a game, including deletes cascading from a team, invalidates cached game payloads
+@receiver(post_save, sender=Game)
+@receiver(post_delete, sender=Game)
+def invalidate_games_cache(sender, **kwargs):
+    transaction.on_commit(bump_games_version)
+
+# game payloads embed both teams with their coach and roster
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+@receiver(post_save, sender=Player)
+@receiver(post_delete, sender=Player)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_games_cache_for_teams(sender, created=False, **kwargs):
+    # a new user is not the coach of a team yet
+    if not (created and sender is User):
+        transaction.on_commit(bump_games_version)
+
+# keep the leaderboard histogram in step with player creates, score changes and deletes (also cascading ones)
+@receiver(post_save, sender=Player)
+def update_leaderboard(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    score = instance.__dict__.get('average_score')
+    if created:
+        adjust_leaderboard(score, 1)
+    elif score is not None:
+        previous_score = getattr(instance, '_stored_average_score', None)
+        if previous_score is not None:
+            move_leaderboard_score(previous_score, score)
+    instance._stored_average_score = score
+
+@receiver(post_delete, sender=Player)
+def remove_from_leaderboard(sender, instance, **kwargs):
+    adjust_leaderboard(instance.average_score, -1)
+
+# cached team and player payloads, a player is part of its team's roster and a user is the coach of a team.
+# Runs before the player count receiver, which moves the stored team of the player to the saved one
+@receiver(post_save, sender=Player)
+@receiver(post_delete, sender=Player)
+def invalidate_cached_player(sender, instance, **kwargs):
+    team_ids = {instance.__dict__.get('team_id'), getattr(instance, '_stored_team_id', None)}
+    invalidate_cached_objects(team_ids=team_ids, player_ids=[instance.pk])
+
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+def invalidate_cached_team(sender, instance, **kwargs):
+    invalidate_cached_objects(team_ids=[instance.pk])
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_coach_team(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_cached_objects(team_ids=Team.objects.filter(coach_id=instance.pk).values_list('id', flat=True))
+
+# keep the team player counts in step with players created outside JoinTeamView, moved or deleted (also cascading)
+@receiver(post_save, sender=Player)
+def update_team_player_count(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    team_id = instance.__dict__.get('team_id')
+    if created:
+        if not getattr(instance, '_slot_reserved', False):
+            move_team_slot(team_id, 1)
+    elif team_id is not None:
+        previous_team_id = getattr(instance, '_stored_team_id', None)
+        if previous_team_id is not None and previous_team_id != team_id:
+            move_team_slot(previous_team_id, -1)
+            move_team_slot(team_id, 1)
+    instance._stored_team_id = team_id
+    instance._slot_reserved = False
+
+@receiver(post_delete, sender=Player)
+def release_team_slot(sender, instance, **kwargs):
+    move_team_slot(instance.team_id, -1)
+
+# cached tokens carry a snapshot of the user, drop it when the user changes or the token is deleted (logout)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_token(sender, instance, **kwargs):
+    invalidate_cached_token(user_id=instance.id)
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_cached_token(key=instance.key, user_id=instance.user_id)
+
+# the cached identity holds the coached team and the player profile of the user
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+def invalidate_coach_token(sender, instance, created=True, **kwargs):
+    if created:
+        invalidate_cached_token(user_id=instance.coach_id)
+
+@receiver(post_save, sender=Player)
+@receiver(post_delete, sender=Player)
+def invalidate_player_token(sender, instance, created=True, **kwargs):
+    if created and instance.user_id is not None:
+        invalidate_cached_token(user_id=instance.user_id)
@@ -0,0 +1,91 @@
+from collections import defaultdict
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.db.models.functions import Cast
+from .cache import invalidate_team_payloads
+from .leaderboard import move_leaderboard_score
+from .models import GameRosterCredit, Player, PlayerGameStat, Team
+
+
+def per_row(values, output_field=None):
+    """CASE WHEN id = ... THEN value ... END, to update several rows with their own values in a single UPDATE."""
+    return Case(*(When(pk=pk, then=Value(value)) for pk, value in values), default=Value(0), output_field=output_field)
+
+def running_average(points):
+    # the right hand sides of an UPDATE read the row before it, so this is (total + points) / (games + 1)
+    return Cast(F('total_points') + points, FloatField()) / (F('scored_games') + 1)
+
+def record_game_stats(game, lines):
+    """
+    Insert the stat lines of a game, a list of (player, points, minutes) with players locked by the caller,
+    and move the running totals and averages of the players and their teams in one UPDATE each.
+    games_played counts the line unless the player was already credited with the game by a roster credit.
+    Must be called inside a transaction.
+    """
+    credited_players = set(GameRosterCredit.objects.filter(game=game, player__in=[player.pk for player, _, _ in lines]).values_list('player_id', flat=True))
+    scored_teams = set(PlayerGameStat.objects.filter(game=game).values_list('team_id', flat=True).distinct())
+    PlayerGameStat.objects.bulk_create([
+        PlayerGameStat(player=player, game=game, team_id=player.team_id, points=points, minutes=minutes)
+        for player, points, minutes in lines
+    ])
+
+    points = [(player.pk, points) for player, points, _ in lines]
+    Player.objects.filter(pk__in=[player.pk for player, _, _ in lines]).update(
+        average_score=running_average(per_row(points)),
+        total_points=F('total_points') + per_row(points),
+        scored_games=F('scored_games') + 1,
+        games_played=F('games_played') + per_row((player.pk, int(player.pk not in credited_players)) for player, _, _ in lines),
+    )
+    for player, line_points, _ in lines:
+        previous_score = player.average_score
+        player.total_points += line_points
+        player.scored_games += 1
+        player.average_score = player.total_points / player.scored_games
+        move_leaderboard_score(previous_score, player.average_score)
+
+    team_points = defaultdict(int)
+    for player, line_points, _ in lines:
+        team_points[player.team_id] += line_points
+    # a team plays a game once, only its first stat lines in the game count the game
+    new_games = [(team_id, int(team_id not in scored_teams)) for team_id in team_points]
+    Team.objects.filter(pk__in=team_points).update(
+        average_score=Cast(F('total_points') + per_row(team_points.items()), FloatField()) / (F('scored_games') + per_row(new_games)),
+        total_points=F('total_points') + per_row(team_points.items()),
+        scored_games=F('scored_games') + per_row(new_games),
+    )
+    # update() does not send post_save, the cached payloads are invalidated here
+    invalidate_team_payloads(team_ids=team_points, player_ids=[player.pk for player, _, _ in lines])
+
+def recompute_averages(player_ids=None, team_ids=None):
+    """
+    Recompute the totals and averages of players and teams (all of them when None) from the stat lines,
+    e.g. after lines were corrected or deleted. The average of players and teams without stat lines is 0,
+    games_played is left alone as it also counts roster credits.
+    """
+    players = Player.objects.all() if player_ids is None else Player.objects.filter(pk__in=player_ids)
+    players = players.annotate(stat_points=Sum('stats__points', default=0), stat_games=Count('stats'))
+    updated = []
+    for player in players.only('team', 'average_score', 'total_points', 'scored_games').iterator(chunk_size=2000):
+        previous_score = player.average_score
+        player.total_points, player.scored_games = player.stat_points, player.stat_games
+        player.average_score = player.total_points / player.scored_games if player.scored_games else 0.0
+        move_leaderboard_score(previous_score, player.average_score)
+        updated.append(player)
+    Player.objects.bulk_update(updated, ['average_score', 'total_points', 'scored_games'], batch_size=1000)
+    # the rosters of the players' teams are cached with their averages
+    invalidate_team_payloads(team_ids={player.team_id for player in updated}, player_ids=[player.pk for player in updated])
+
+    teams = Team.objects.all() if team_ids is None else Team.objects.filter(pk__in=team_ids)
+    totals = {
+        row['team']: row
+        for row in PlayerGameStat.objects.filter(team__in=teams.values('pk')).values('team').annotate(
+            points=Sum('points'), games=Count('game', distinct=True)
+        ).order_by()
+    }
+    updated = []
+    for team in teams.only('average_score', 'total_points', 'scored_games'):
+        row = totals.get(team.pk, {'points': 0, 'games': 0})
+        team.total_points, team.scored_games = row['points'], row['games']
+        team.average_score = team.total_points / team.scored_games if team.scored_games else 0.0
+        updated.append(team)
+    Team.objects.bulk_update(updated, ['average_score', 'total_points', 'scored_games'], batch_size=1000)
+    invalidate_team_payloads(team_ids=[team.pk for team in updated])
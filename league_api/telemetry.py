@@ -0,0 +1,109 @@
+import atexit
+import logging
+import threading
+from functools import lru_cache
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from .models import LoginActivity, OnlineSession
+
+logger = logging.getLogger(__name__)
+
+
+class LoginActivityBuffer:
+    """
+    Write-behind buffer for login activity rows, flushed with one bulk insert when it holds LOGIN_ACTIVITY_BUFFER_SIZE
+    rows or LOGIN_ACTIVITY_FLUSH_INTERVAL seconds after the first buffered row, whichever comes first.
+    With LOGIN_ACTIVITY_SYNC every row is inserted right away. Rows buffered by a process that dies are lost.
+    A flush never raises: rows of deleted users are dropped, rows that could not be written are buffered again,
+    so a failed insert does not fail the request (of another user) that triggered the flush.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = []
+        self.timer = None
+
+    def add(self, activity):
+        if settings.LOGIN_ACTIVITY_SYNC:
+            activity.save()
+            return
+        with self.lock:
+            self.pending.append(activity)
+            full = len(self.pending) >= settings.LOGIN_ACTIVITY_BUFFER_SIZE
+            if not full:
+                self.start_timer()
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if not pending:
+            return 0
+        try:
+            # a logout handled by another process already recorded the session of a user who is offline by now,
+            # or whose presence started after the buffered login
+            online_since = dict(OnlineSession.objects.filter(user__in={activity.user_id for activity in pending}).values_list('user', 'since'))
+            pending = [
+                activity for activity in pending
+                if activity.user_id in online_since and activity.login_time >= online_since[activity.user_id]
+            ]
+            with transaction.atomic():
+                LoginActivity.objects.bulk_create(pending, batch_size=1000)
+            return len(pending)
+        except IntegrityError:
+            # a user deleted since the login fails the whole batch, the other rows are inserted one by one
+            return self.insert_one_by_one(pending)
+        except DatabaseError:
+            logger.exception('Failed to write %d login activity rows, they are kept for the next flush', len(pending))
+            self.requeue(pending)
+            return 0
+
+    def insert_one_by_one(self, pending):
+        inserted = 0
+        for index, activity in enumerate(pending):
+            try:
+                with transaction.atomic():
+                    activity.save()
+                inserted += 1
+            except IntegrityError:
+                logger.warning('Dropped the login activity of user %s, the user no longer exists', activity.user_id)
+            except DatabaseError:
+                logger.exception('Failed to write %d login activity rows, they are kept for the next flush', len(pending) - index)
+                self.requeue(pending[index:])
+                break
+        return inserted
+
+    def requeue(self, activities):
+        with self.lock:
+            self.pending[:0] = activities
+            self.start_timer()
+
+    def start_timer(self):
+        # called with the lock held
+        if self.timer is None:
+            self.timer = threading.Timer(settings.LOGIN_ACTIVITY_FLUSH_INTERVAL, self.flush_from_timer)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # the timer thread opened its own connection
+            connection.close()
+
+@lru_cache(maxsize=None)
+def get_login_activity_buffer():
+    buffer = LoginActivityBuffer()
+    atexit.register(buffer.flush)
+    return buffer
+
+def record_login_activity(user, login_time):
+    get_login_activity_buffer().add(LoginActivity(user=user, login_time=login_time))
+
+def flush_login_activity():
+    return get_login_activity_buffer().flush()
@@ -1,9 +1,39 @@
-from rest_framework.test import APITestCase
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
 from django.urls import reverse
 from rest_framework import status
-from .models import User, Team, Player, Game
+from .models import User, Team, Player, Game, Standings, LoginActivity, LoginActivityRollup, OnlineSession, LeaderboardBucket, PlayerGameStat, ScoreEvent
 from django.utils.timezone import now
-
+from datetime import datetime, timedelta, timezone
+from django.core.management import call_command
+from django.core.cache import cache, caches
+from django.db import IntegrityError, OperationalError, connection
+from django.db.models import Q
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from io import StringIO
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest import mock, skipUnless
+import asyncio
+import json
+import msgpack
+import os
+import tempfile
+import threading
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from .renderers import ORJSONRenderer
+from .serializers import GameSerializer, PlayerSerializer, TeamSerializer
+from .services import credit_roster_games_played
+from .scoring import fold_score_events
+from .registrations import get_registration_pool
+from .cache import get_object_cache_key, set_cached_object
+from .stats import recompute_averages
+from .constants import ERROR_CODES
+from .telemetry import flush_login_activity, get_login_activity_buffer, record_login_activity
+from .broadcast import InProcessBroadcaster, LEAGUE_CHANNEL, game_channel, get_broadcaster
+
+@override_settings(LOGIN_ACTIVITY_SYNC=True)
 class CustomAuthTokenViewTests(APITestCase):
 
     def setUp(self):
@@ -21,9 +51,82 @@ class CustomAuthTokenViewTests(APITestCase):
         response = self.client.post(self.create_url, {'username': 'admin', 'password': '******'})
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def login(self):
+        response = self.client.post(self.create_url, {'username': 'admin', 'password': 'admin@123'})
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {response.data["token"]}')
+
+    def test_token_authentication_is_cached(self):
+        self.login()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('get-current-user'))
+        self.assertEqual(response.data, {'id': self.user.id, 'username': 'admin', 'email': 'admin@basketball.league.com', 'role': 'admin'})
+
+    def test_logout_invalidates_cached_token(self):
+        self.login()
+        self.client.get(reverse('get-current-user'))
+        response = self.client.post(reverse('api_token_logout'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(reverse('get-current-user'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_update_invalidates_cached_token(self):
+        self.login()
+        self.client.get(reverse('get-current-user'))
+        self.user.role = 'coach'
+        self.user.save()
+
+        response = self.client.get(reverse('get-current-user'))
+        self.assertEqual(response.data['role'], 'coach')
+
+
+@override_settings(LOGIN_ACTIVITY_SYNC=True)
+class IdentityContextTests(APITestCase):
+    def setUp(self):
+        caches['auth_tokens'].clear()
+        self.coach1 = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123',
+                                               username='coach1', role='coach')
+        self.coach2 = User.objects.create_user(email='coach2@basketball.league.com', password='coach@123',
+                                               username='coach2', role='coach')
+        self.team1 = Team.objects.create(name='Team 1', coach=self.coach1)
+        self.team2 = Team.objects.create(name='Team 2', coach=self.coach2)
+        self.player = Player.objects.create(name='Player 1', height=6.0, team=self.team1)
+
+    def login(self, username):
+        response = self.client.post(reverse('api_token_auth'), {'username': username, 'password': 'coach@123'})
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {response.data["token"]}')
+
+    def test_coach_checks_compare_cached_ids(self):
+        self.login('coach1')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('player_list', kwargs={'pk': self.team1.id}), {'is_percentile_90': 'false'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('player_list', kwargs={'pk': self.team2.id}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('team_detail', kwargs={'pk': self.team1.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(3):
+            response = self.client.put(reverse('update_count_played_games'), {'player_id': self.player.id})
+        self.assertEqual(response.data['games_played'], 1)
+
+    def test_identity_follows_team_changes(self):
+        coach3 = User.objects.create_user(email='coach3@basketball.league.com', password='coach@123',
+                                          username='coach3', role='coach')
+        self.login('coach3')
+        self.client.get(reverse('get-current-user'))
+        team = Team.objects.create(name='Team 3', coach=coach3)
+
+        response = self.client.get(reverse('team_detail', kwargs={'pk': team.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('team_detail', kwargs={'pk': self.team1.id}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
 
 class ScoreboardViewTests(APITestCase):
     def setUp(self):
+        cache.clear()
         # Create a user and authenticate
         self.user = User.objects.create_user(email='admin@basketball.league.com',username='admin', password='password123', role='admin')
         self.client.force_authenticate(user=self.user)
@@ -41,7 +144,307 @@ class ScoreboardViewTests(APITestCase):
         url = reverse('scoreboard')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)  # Assuming only one game in the database
+        self.assertEqual(len(response.data['results']), 1)  # Assuming only one game in the database
+
+    def test_scoreboard_query_count_is_fixed(self):
+        for i in range(3):
+            user = User.objects.create_user(email=f'player{i}@basketball.league.com', username=f'player{i}', password='player@123', role='player')
+            Player.objects.create(name=f'Player {i}', height=6.0, team=self.team1, user=user)
+        for _ in range(20):
+            Game.objects.create(team1=self.team1, team2=self.team2, team1_score=10, team2_score=5, date=now(), winner=self.team1)
+
+        url = reverse('scoreboard')
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 21)
+        self.assertEqual(len(response.data['results'][1]['team1']['players']), 3)
+
+    def test_scoreboard_cursor_pagination(self):
+        for _ in range(4):
+            Game.objects.create(team1=self.team1, team2=self.team2, team1_score=0, team2_score=0, date=now())
+
+        url = reverse('scoreboard')
+        first_page = self.client.get(url, {'page_size': 3})
+        self.assertEqual(len(first_page.data['results']), 3)
+        self.assertIsNotNone(first_page.data['next'])
+
+        second_page = self.client.get(first_page.data['next'])
+        self.assertEqual(len(second_page.data['results']), 2)
+        self.assertIsNone(second_page.data['next'])
+        seen = [game['id'] for game in first_page.data['results'] + second_page.data['results']]
+        self.assertEqual(seen, list(Game.objects.order_by('date', 'id').values_list('id', flat=True)))
+
+    def test_scoreboard_is_served_from_cache_until_a_game_changes(self):
+        url = reverse('scoreboard')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached.data['results'][0]['team1_score'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse('update_team_score'), {'game_id': self.game.id, 'team1_score': 21, 'team2_score': ''})
+        response = self.client.get(url)
+        self.assertEqual(response.data['results'][0]['team1_score'], 21)
+
+        stats = self.client.get(reverse('cache_stats'))
+        self.assertEqual(stats.data['scoreboard']['hits'], 1)
+        self.assertEqual(stats.data['scoreboard']['misses'], 2)
+
+    def test_scoreboard_cache_is_invalidated_by_cascading_deletes(self):
+        url = reverse('scoreboard')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team1.delete()
+        response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 0)
+
+    def test_scoreboard_cache_is_invalidated_by_team_and_roster_changes(self):
+        url = reverse('scoreboard')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Player.objects.create(name='Player 1', height=6.0, team=self.team1)
+            self.team1.name = 'Team One'
+            self.team1.save()
+        team1 = self.client.get(url).data['results'][0]['team1']
+        self.assertEqual((team1['name'], [player['name'] for player in team1['players']]), ('Team One', ['Player 1']))
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='admin@basketball.league.com', username='admin', password='password123', role='admin')
+        self.client.force_authenticate(user=self.user)
+        self.coach1 = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123',
+                                               username='coach1', role='coach')
+        self.coach2 = User.objects.create_user(email='coach2@basketball.league.com', password='coach@123',
+                                               username='coach2', role='coach')
+        self.team1 = Team.objects.create(name='Team 1', coach=self.coach1)
+        self.team2 = Team.objects.create(name='Team 2', coach=self.coach2)
+        self.player = Player.objects.create(name='Player 1', height=6.0, team=self.team1)
+        self.game = Game.objects.create(team1=self.team1, team2=self.team2, team1_score=12, team2_score=0, date=now())
+
+    def test_scoreboard_renders_and_loads_only_requested_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('scoreboard'), {'fields': 'id,team1.name,team1_score', 'expand': 'team1'})
+        self.assertEqual(response.data['results'][0], {'id': self.game.id, 'team1': {'name': 'Team 1'}, 'team1_score': 12})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('team2_score', queries[0]['sql'])
+        self.assertNotIn('league_api_player', queries[0]['sql'])
+
+    def test_empty_expand_collapses_relations_to_ids(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('team_list'), {'expand': ''})
+        team = next(team for team in response.data if team['id'] == self.team1.id)
+        self.assertEqual(team['coach'], self.coach1.id)
+        self.assertEqual(team['players'], [self.player.id])
+
+    def test_nested_expansion_is_opt_in(self):
+        response = self.client.get(reverse('player_detail', kwargs={'pk': self.player.id}), {'expand': 'team'})
+        self.assertEqual(response.data['team'], {'id': self.team1.id, 'name': 'Team 1'})
+        response = self.client.get(reverse('player_detail', kwargs={'pk': self.player.id}))
+        self.assertEqual(response.data['team'], self.team1.id)
+
+    def test_default_payload_is_unchanged(self):
+        response = self.client.get(reverse('team_detail', kwargs={'pk': self.team1.id}))
+        self.assertEqual(response.data['coach']['username'], 'coach1')
+        self.assertEqual(response.data['players'][0]['name'], 'Player 1')
+        self.assertEqual(list(response.data), ['id', 'name', 'coach', 'players', 'average_score'])
+
+class RepresentationContractTests(APITestCase):
+    """The read endpoints build their default output without the model serializers, it must not change a byte."""
+
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_superuser(email='admin@basketball.league.com', password='admin@123',
+                                                        username='admin', role='admin')
+        self.coach1 = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123', username='coach1',
+                                               role='coach', login_count=3, total_time_spent=timedelta(hours=2, microseconds=1500))
+        self.coach2 = User.objects.create_user(email='coach2@basketball.league.com', password='coach@123', username='coach2', role='coach')
+        self.team1 = Team.objects.create(name='Team 1', coach=self.coach1, average_score=12.5)
+        self.team2 = Team.objects.create(name='Équipe 2', coach=self.coach2)
+        self.player = Player.objects.create(name='Player 1', height=6.1, average_score=1 / 3, games_played=4, team=self.team1)
+        Player.objects.create(name='Player 2', height=5.9, team=self.team1)
+        Game.objects.create(team1=self.team1, team2=self.team2, team1_score=80, team2_score=70, winner=self.team1,
+                            date=datetime(2023, 6, 1, 18, 30, 15, 123456, tzinfo=timezone.utc))
+        Game.objects.create(team1=self.team2, team2=self.team1, team1_score=0, team2_score=0, date=now())
+        self.client.force_authenticate(user=self.admin_user)
+
+    def render(self, serializer_class, instance, many=False):
+        return JSONRenderer().render(serializer_class(instance, many=many).data)
+
+    def test_scoreboard(self):
+        response = self.client.get(reverse('scoreboard'))
+        results = self.render(GameSerializer, Game.objects.order_by('date', 'id'), many=True)
+        self.assertIn(b'"results":' + results, response.content)
+
+    def test_team_list_and_detail(self):
+        response = self.client.get(reverse('team_list'))
+        self.assertEqual(response.content, self.render(TeamSerializer, Team.objects.all(), many=True))
+        response = self.client.get(reverse('team_detail', kwargs={'pk': self.team1.id}))
+        self.assertEqual(response.content, self.render(TeamSerializer, Team.objects.get(pk=self.team1.pk)))
+
+    def test_player_detail(self):
+        response = self.client.get(reverse('player_detail', kwargs={'pk': self.player.id}))
+        self.assertEqual(response.content, self.render(PlayerSerializer, Player.objects.get(pk=self.player.pk)))
+        self.assertEqual(self.client.get(reverse('player_detail', kwargs={'pk': 0})).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_team_detail_permission(self):
+        self.client.force_authenticate(user=self.coach2)
+        response = self.client.get(reverse('team_detail', kwargs={'pk': self.team1.id}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(reverse('team_detail', kwargs={'pk': self.team2.id}))
+        # rendered from the stored team, the coach created in memory still holds the '0:00:00' default of total_time_spent
+        self.assertEqual(response.content, self.render(TeamSerializer, Team.objects.get(pk=self.team2.pk)))
+
+    def test_renderer_matches_json_renderer(self):
+        data = {'date': datetime(2023, 6, 1, 18, 30, 15, 123456, tzinfo=timezone.utc), 'duration': timedelta(minutes=5),
+                'name': 'Équipe', 'score': 1 / 3, 1: None}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+class MessagePackTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_superuser(email='admin@basketball.league.com', password='admin@123', username='admin',
+                                                        role='admin', total_time_spent=timedelta(minutes=90))
+        self.coach = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123', username='coach1', role='coach')
+        self.team1 = Team.objects.create(name='Team 1', coach=self.admin_user)
+        self.team2 = Team.objects.create(name='Team 2', coach=self.coach)
+        self.game = Game.objects.create(team1=self.team1, team2=self.team2, team1_score=0, team2_score=0,
+                                        date=datetime(2023, 6, 1, 18, 30, tzinfo=timezone.utc))
+        self.client.force_authenticate(user=self.admin_user)
+
+    def get(self, url, accept):
+        return self.client.get(url, HTTP_ACCEPT=accept)
+
+    def test_responses_match_json(self):
+        for url in (reverse('scoreboard'), reverse('team_list'), reverse('team_detail', kwargs={'pk': self.team1.id}),
+                    reverse('standings'), reverse('site_statistics'), reverse('cache_stats')):
+            response = self.get(url, 'application/msgpack')
+            self.assertEqual(response['Content-Type'], 'application/msgpack')
+            self.assertEqual(msgpack.unpackb(response.content), self.get(url, 'application/json').json())
+
+        game = msgpack.unpackb(self.get(reverse('scoreboard'), 'application/msgpack').content)['results'][0]
+        self.assertEqual(game['date'], '2023-06-01T18:30:00Z')
+        self.assertEqual(game['team1']['coach']['total_time_spent'], '01:30:00')
+
+    def test_errors_are_rendered(self):
+        response = self.get(reverse('team_detail', kwargs={'pk': 0}), 'application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIn('detail', msgpack.unpackb(response.content))
+
+    def test_request_body(self):
+        body = msgpack.packb([{'game_id': self.game.id, 'team1_score': 10, 'team2_score': 4}])
+        response = self.client.put(reverse('batch_update_team_score'), body, content_type='application/msgpack', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(msgpack.unpackb(response.content), [{'game_id': self.game.id, 'team1_score': 10, 'team2_score': 4}])
+
+        response = self.client.put(reverse('batch_update_team_score'), b'\x92\x01', content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_login(self):
+        self.client.force_authenticate(user=None)
+        body = msgpack.packb({'username': 'coach1', 'password': 'coach@123'})
+        response = self.client.post(reverse('api_token_auth'), body, content_type='application/msgpack', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), {'token': Token.objects.get(user=self.coach).key})
+
+    def test_benchmark_command(self):
+        output = StringIO()
+        call_command('benchmark_formats', repeat=1, stdout=output)
+        self.assertEqual(len(output.getvalue().splitlines()), 5)
+
+class ObjectCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_superuser(email='admin@basketball.league.com', password='admin@123',
+                                                        username='admin', role='admin')
+        self.coach1 = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123', username='coach1', role='coach')
+        self.coach2 = User.objects.create_user(email='coach2@basketball.league.com', password='coach@123', username='coach2', role='coach')
+        self.team1 = Team.objects.create(name='Team 1', coach=self.coach1)
+        self.team2 = Team.objects.create(name='Team 2', coach=self.coach2)
+        self.player = Player.objects.create(name='Player 1', height=6.0, team=self.team1)
+        self.team_url = reverse('team_detail', kwargs={'pk': self.team1.id})
+        self.player_url = reverse('player_detail', kwargs={'pk': self.player.id})
+        self.client.force_authenticate(user=self.admin_user)
+
+    def get_without_team_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        # the identity of a force authenticated user is still loaded
+        self.assertFalse([query for query in queries if 'FROM "league_api_team"' in query['sql'] or 'FROM "league_api_player"' in query['sql']])
+        return response
+
+    def test_payload_read_before_a_write_commits_is_not_served(self):
+        # a reader misses and reads the row, then the write commits before the reader stores its payload
+        cache_key = get_object_cache_key('players', self.player.id)
+        stale = self.client.get(self.player_url).data
+        with self.captureOnCommitCallbacks(execute=True):
+            self.player.name = 'Player One'
+            self.player.save()
+        set_cached_object(cache_key, stale)
+        self.assertEqual(self.client.get(self.player_url).data['name'], 'Player One')
+
+    def test_team_is_cached_until_its_roster_changes(self):
+        self.client.get(self.team_url)
+        response = self.get_without_team_queries(self.team_url)
+        self.assertEqual([player['name'] for player in response.data['players']], ['Player 1'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.player.name = 'Player One'
+            self.player.save()
+        response = self.client.get(self.team_url)
+        self.assertEqual([player['name'] for player in response.data['players']], ['Player One'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.player.team = self.team2
+            self.player.save()
+        self.assertEqual(self.client.get(self.team_url).data['players'], [])
+
+        stats = self.client.get(reverse('cache_stats')).data['teams']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 3))
+
+    def test_team_is_invalidated_by_its_coach(self):
+        self.client.get(self.team_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coach1.email = 'head.coach1@basketball.league.com'
+            self.coach1.save()
+        self.assertEqual(self.client.get(self.team_url).data['coach']['email'], 'head.coach1@basketball.league.com')
+
+    @override_settings(LOGIN_ACTIVITY_SYNC=True)
+    def test_coach_login_invalidates_team_and_scoreboard(self):
+        Game.objects.create(team1=self.team1, team2=self.team2, team1_score=0, team2_score=0, date=now())
+        self.client.get(self.team_url)
+        self.client.get(reverse('scoreboard'))
+        self.client.force_authenticate(user=None)
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('api_token_auth'), {'username': 'coach1', 'password': 'coach@123'})
+        # the coached team comes from the identity loaded for the token
+        self.assertEqual(len([query for query in queries if 'FROM "league_api_team"' in query['sql']]), 0)
+
+        self.client.force_authenticate(user=self.admin_user)
+        self.assertEqual(self.client.get(self.team_url).data['coach']['login_count'], 1)
+        self.assertEqual(self.client.get(reverse('scoreboard')).data['results'][0]['team1']['coach']['login_count'], 1)
+
+    def test_cached_team_respects_permissions(self):
+        self.client.get(self.team_url)
+        self.client.force_authenticate(user=self.coach2)
+        self.assertEqual(self.client.get(self.team_url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.coach1)
+        self.assertEqual(self.get_without_team_queries(self.team_url).status_code, status.HTTP_200_OK)
+
+    def test_player_is_cached_until_it_changes(self):
+        self.client.get(self.player_url)
+        self.assertEqual(self.get_without_team_queries(self.player_url).data['games_played'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            credit_roster_games_played(Game.objects.create(team1=self.team1, team2=self.team2, team1_score=0, team2_score=0, date=now()).id, self.team1.id)
+        self.assertEqual(self.client.get(self.player_url).data['games_played'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.player.delete()
+        self.assertEqual(self.client.get(self.player_url).status_code, status.HTTP_404_NOT_FOUND)
 
 class TeamListViewTests(APITestCase):
     def setUp(self):
@@ -97,6 +500,24 @@ class PlayerListViewTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 2)  # Assuming two players in the team
 
+    def test_get_player_list_by_percentile(self):
+        Player.objects.filter(id=self.player1.id).update(average_score=20.0)
+        for i, score in enumerate([5.0, 10.0, 12.0, 15.0]):
+            user = User.objects.create_user(email=f'player{i}@basketball.league.com', username=f'player{i}', password='player@123', role='player')
+            Player.objects.create(name=f'Player {i + 3}', height=6.0, team=self.team, user=user, average_score=score)
+        url = reverse('player_list', kwargs={'pk': self.team.id})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual([player['average_score'] for player in response.data], [20.0])
+        self.assertEqual(sum('FROM "league_api_player"' in query['sql'] for query in queries), 1)
+
+        response = self.client.get(url, {'percentile': 50})
+        self.assertEqual(sorted(player['average_score'] for player in response.data), [10.0, 12.0, 15.0, 20.0])
+
+        response = self.client.get(url, {'percentile': 'high'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 class PlayerDetailViewTests(APITestCase):
     def setUp(self):
         # Create a user and authenticate
@@ -202,6 +623,63 @@ class RegisterPlayerViewTests(APITestCase):
         self.assertEqual(response.data['detail'], 'Username is already in use.')
 
 
+class BulkRegisterTests(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(email='admin@basketball.league.com', password='admin@123',
+                                                        username='admin', role='admin')
+        self.client.force_authenticate(user=self.admin_user)
+        self.csv = (
+            'username,email,role\n'
+            'coach1,coach1@basketball.league.com,coach\n'
+            'player1,player1@basketball.league.com,player\n'
+            'admin,new-admin@basketball.league.com,coach\n'
+            'player2,player1@basketball.league.com,player\n'
+            'player3,not-an-email,referee\n'
+        )
+
+    @override_settings(REGISTRATION_HASH_WORKERS=0)
+    def test_bulk_register_reports_every_row(self):
+        upload = SimpleUploadedFile('users.csv', self.csv.encode(), content_type='text/csv')
+        response = self.client.post(reverse('register_bulk'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 3))
+        self.assertEqual([row['status'] for row in response.data['rows']], ['created', 'created', 'failed', 'failed', 'failed'])
+        self.assertEqual(response.data['rows'][2]['errors'], ['Username is already in use.'])
+        self.assertEqual(response.data['rows'][3]['errors'], ['Email is duplicated in the file.'])
+        self.assertEqual(len(response.data['rows'][4]['errors']), 2)
+
+        player = User.objects.get(username='player1')
+        self.assertEqual(player.role, 'player')
+        self.assertTrue(player.check_password('player@123'))
+
+        upload = SimpleUploadedFile('users.csv', b'name,email\nx,x@basketball.league.com\n', content_type='text/csv')
+        response = self.client.post(reverse('register_bulk'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(REGISTRATION_HASH_WORKERS=2)
+    def test_bulk_register_reuses_the_process_pool(self):
+        get_registration_pool.cache_clear()
+        self.addCleanup(get_registration_pool.cache_clear)
+        with mock.patch('league_api.registrations.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool_class:
+            for csv_text in (self.csv, 'username,email,role\ncoach2,coach2@basketball.league.com,coach\n'):
+                upload = SimpleUploadedFile('users.csv', csv_text.encode(), content_type='text/csv')
+                response = self.client.post(reverse('register_bulk'), {'file': upload}, format='multipart')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+        pool_class.assert_called_once()
+        self.addCleanup(get_registration_pool().shutdown)
+        self.assertTrue(User.objects.get(username='coach2').check_password('coach@123'))
+
+    def test_register_users_command_hashes_in_worker_processes(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as source:
+            source.write(self.csv)
+        self.addCleanup(os.remove, source.name)
+        output = StringIO()
+        call_command('register_users', source.name, '--workers', '2', '--batch-size', '2', stdout=output)
+
+        self.assertIn('2 users registered, 3 rows failed', output.getvalue())
+        self.assertTrue(User.objects.get(username='coach1').check_password('coach@123'))
+
+
 class CreateTeamViewTests(APITestCase):
 
     def setUp(self):
@@ -264,6 +742,59 @@ class JoinTeamViewTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data['detail'], 'This team already has 10 players.')
 
+    def test_player_count_follows_joins_and_removals(self):
+        response = self.client.post(self.join_url, {'player_name': 'John Doe', 'height': 6.5, 'team_id': self.team.id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # joining a second team fails on the player's unique user and releases the reserved slot
+        other_team = Team.objects.create(name='Team 2', coach=User.objects.create_user(email='coach2@basketball.league.com', password='coach@123', username='coach2', role='coach'))
+        response = self.client.post(self.join_url, {'player_name': 'John Doe', 'height': 6.5, 'team_id': other_team.id})
+        self.assertNotEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Team.objects.get(id=other_team.id).player_count, 0)
+        self.assertEqual(Team.objects.get(id=self.team.id).player_count, 1)
+
+        player = Player.objects.get(user=self.player_user)
+        player.team = other_team
+        player.save()
+        self.assertEqual([team.player_count for team in Team.objects.order_by('id')], [0, 1])
+        player.delete()
+        self.assertEqual([team.player_count for team in Team.objects.order_by('id')], [0, 0])
+
+    @override_settings(TEAM_MAX_PLAYERS=2)
+    def test_join_team_cap_is_configurable(self):
+        for index in range(2):
+            user = User.objects.create_user(email=f'player_{index}@basketball.league.com', password='player@123', username=f'player_{index}', role='player')
+            Player.objects.create(name=f'Player {index}', height=6.0, team=self.team, user=user)
+        response = self.client.post(self.join_url, {'player_name': 'John Doe', 'height': 6.5, 'team_id': self.team.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['detail'], 'This team already has 2 players.')
+
+class JoinTeamConcurrencyTests(APITransactionTestCase):
+
+    # SQLite takes a lock on the whole database for every write, the test needs row level locks
+    @skipUnless(connection.vendor == 'postgresql', 'concurrent writes need PostgreSQL')
+    def test_cap_holds_under_parallel_joins(self):
+        coach = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123', username='coach1', role='coach')
+        team = Team.objects.create(name='Team 1', coach=coach)
+        users = User.objects.bulk_create([
+            User(email=f'player{index}@basketball.league.com', username=f'player{index}', role='player') for index in range(300)
+        ])
+
+        def join(user):
+            client = APIClient()
+            client.force_authenticate(user=user)
+            try:
+                return client.post(reverse('join_team'), {'player_name': user.username, 'height': 6.0, 'team_id': team.id}).status_code
+            finally:
+                connection.close()
+
+        # every worker holds a database connection, keep them below max_connections
+        with ThreadPoolExecutor(max_workers=50) as executor:
+            statuses = list(executor.map(join, users))
+
+        self.assertEqual(statuses.count(status.HTTP_201_CREATED), 10)
+        self.assertEqual(statuses.count(status.HTTP_400_BAD_REQUEST), len(users) - 10)
+        self.assertEqual(Player.objects.filter(team=team).count(), 10)
+        self.assertEqual(Team.objects.get(id=team.id).player_count, 10)
 
 class CreateGameViewTests(APITestCase):
 
@@ -308,6 +839,39 @@ class UpdateCountGamesViewTests(APITestCase):
         self.player.refresh_from_db()
         self.assertEqual(self.player.games_played, 1)
 
+    def test_update_roster_count_games_once_per_game(self):
+        for i in range(2, 4):
+            Player.objects.create(name=f'Player {i}', height=6.0, team=self.team)
+        coach2 = User.objects.create_user(email='coach2@basketball.league.com', password='coach@123', username='coach2', role='coach')
+        coach3 = User.objects.create_user(email='coach3@basketball.league.com', password='coach@123', username='coach3', role='coach')
+        team2 = Team.objects.create(name='Team 2', coach=coach2)
+        other = Player.objects.create(name='Player 4', height=6.0, team=team2)
+        game = Game.objects.create(team1=self.team, team2=team2, team1_score=0, team2_score=0, date=now())
+        url = reverse('update_roster_played_games')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'game_id': game.id}, format='json')
+        self.assertEqual(response.data, {'game_id': game.id, 'credited_players': 3, 'already_credited': False})
+        self.assertEqual(sum(query['sql'].startswith('UPDATE "league_api_player"') for query in queries), 1)
+
+        response = self.client.post(url, {'game_id': game.id}, format='json')
+        self.assertTrue(response.data['already_credited'])
+        self.assertEqual(sorted(Player.objects.values_list('games_played', flat=True)), [0, 1, 1, 1])
+
+        second_game = Game.objects.create(team1=self.team, team2=team2, team1_score=0, team2_score=0, date=now())
+        response = self.client.post(url, {'game_id': second_game.id, 'player_ids': [self.player.id, other.id]}, format='json')
+        self.assertEqual(response.data['credited_players'], 1)
+        self.player.refresh_from_db()
+        self.assertEqual(self.player.games_played, 2)
+        # the rest of the roster is credited by a later call, the listed player only once
+        response = self.client.post(url, {'game_id': second_game.id}, format='json')
+        self.assertEqual(response.data, {'game_id': second_game.id, 'credited_players': 2, 'already_credited': False})
+        self.assertEqual(sorted(Player.objects.filter(team=self.team).values_list('games_played', flat=True)), [2, 2, 2])
+
+        third_game = Game.objects.create(team1=team2, team2=Team.objects.create(name='Team 3', coach=coach3), team1_score=0, team2_score=0, date=now())
+        response = self.client.post(url, {'game_id': third_game.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class UpdateTeamScoreViewTests(APITestCase):
 
@@ -337,6 +901,189 @@ class UpdateTeamScoreViewTests(APITestCase):
         self.assertEqual(self.game.team1_score, 13)
         self.assertEqual(self.game.team2_score, 0)
 
+    def test_finalized_game_score_is_final(self):
+        self.client.put(self.update_url, {'game_id': self.game.id, 'team1_score': 10, 'team2_score': 5})
+        self.client.post(reverse('finalize_game', kwargs={'pk': self.game.id}))
+        response = self.client.put(self.update_url, {'game_id': self.game.id, 'team1_score': 10, 'team2_score': 50})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.team2_score, 5)
+
+        response = self.client.put(reverse('batch_update_team_score'), [{'game_id': self.game.id, 'team2_score': 50}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('game_id', response.data['errors'][0])
+        standings = Standings.objects.get(team=self.team1)
+        self.assertEqual((standings.wins, standings.points_for, standings.points_against), (1, 10, 5))
+
+class BatchUpdateTeamScoreViewTests(APITestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(email='admin@basketball.league.com', password='admin@123',
+                                                        username='admin', role='admin')
+        self.coach1 = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123',
+                                               username='coach1', role='coach')
+        self.coach2 = User.objects.create_user(email='coach2@basketball.league.com', password='coach@123',
+                                               username='coach2', role='coach')
+        self.team1 = Team.objects.create(name='Team 1', coach=self.coach1)
+        self.team2 = Team.objects.create(name='Team 2', coach=self.coach2)
+        self.games = [Game.objects.create(team1=self.team1, team2=self.team2, team1_score=0, team2_score=0, date=now()) for _ in range(3)]
+
+        self.update_url = reverse('batch_update_team_score')
+        self.client.force_authenticate(user=self.admin_user)
+
+    def test_batch_update_scores(self):
+        data = [
+            {'game_id': self.games[0].id, 'team1_score': 80, 'team2_score': 70},
+            {'game_id': self.games[1].id, 'team1_score': 60, 'team2_score': 75},
+            {'game_id': self.games[2].id, 'team2_score': 12},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(self.update_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(item['team1_score'], item['team2_score']) for item in response.data], [(80, 70), (60, 75), (0, 12)])
+        # one read, one bulk update and the standings, whatever the number of games
+        self.assertLessEqual(len(queries), 8)
+
+        incremental = list(Standings.objects.order_by('team').values())
+        call_command('rebuild_standings', stdout=StringIO())
+        self.assertEqual(list(Standings.objects.order_by('team').values()), incremental)
+        # games without a winner count their points only
+        self.assertEqual((incremental[0]['wins'], incremental[0]['losses'], incremental[0]['streak']), (0, 0, 0))
+        self.assertEqual((incremental[0]['points_for'], incremental[0]['points_against']), (140, 157))
+
+    def test_batch_is_rejected_as_a_whole(self):
+        data = [
+            {'game_id': self.games[0].id, 'team1_score': 80, 'team2_score': 70},
+            {'game_id': 0, 'team1_score': 1},
+            {'game_id': self.games[0].id, 'team1_score': 10},
+        ]
+        response = self.client.put(self.update_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'][0], {})
+        self.assertIn('game_id', response.data['errors'][1])
+        self.assertIn('game_id', response.data['errors'][2])
+        self.games[0].refresh_from_db()
+        self.assertEqual(self.games[0].team1_score, 0)
+
+        response = self.client.put(self.update_url, [{'game_id': self.games[0].id, 'team1_score': -1}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class ScoreEventTests(APITestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(email='admin@basketball.league.com', password='admin@123',
+                                                        username='admin', role='admin')
+        self.coach1 = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123',
+                                               username='coach1', role='coach')
+        self.coach2 = User.objects.create_user(email='coach2@basketball.league.com', password='coach@123',
+                                               username='coach2', role='coach')
+        self.team1 = Team.objects.create(name='Team 1', coach=self.coach1)
+        self.team2 = Team.objects.create(name='Team 2', coach=self.coach2)
+        self.game = Game.objects.create(team1=self.team1, team2=self.team2, team1_score=0, team2_score=0, date=now())
+
+        self.events_url = reverse('score_events')
+        self.finalize_url = reverse('finalize_game', kwargs={'pk': self.game.id})
+        self.client.force_authenticate(user=self.admin_user)
+
+    def post_events(self, *events):
+        return self.client.post(self.events_url, {'events': [
+            {'game_id': self.game.id, 'team_id': team.id, 'points': points} for team, points in events
+        ]}, format='json')
+
+    def test_events_are_folded_into_totals_and_standings(self):
+        response = self.post_events((self.team1, 2), (self.team1, 3), (self.team2, 2))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['games'], [{'game_id': self.game.id, 'team1_score': 5, 'team2_score': 2}])
+        response = self.post_events((self.team2, 3), (self.team1, -1))
+        self.assertEqual(response.data['games'], [{'game_id': self.game.id, 'team1_score': 4, 'team2_score': 5}])
+
+        self.game.refresh_from_db()
+        self.assertEqual((self.game.team1_score, self.game.team2_score), (4, 5))
+        self.assertFalse(ScoreEvent.objects.filter(folded=False).exists())
+        incremental = list(Standings.objects.order_by('team').values())
+        call_command('rebuild_standings', stdout=StringIO())
+        self.assertEqual(list(Standings.objects.order_by('team').values()), incremental)
+
+    def test_pending_events_are_folded_once(self):
+        ScoreEvent.objects.bulk_create([ScoreEvent(game=self.game, team=self.team1, points=2) for _ in range(3)])
+        self.assertEqual(fold_score_events(), {self.game.id: (6, 0)})
+        self.assertEqual(fold_score_events(), {})
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.team1_score, 6)
+
+    def test_invalid_events_are_rejected(self):
+        other = Team.objects.create(name='Team 3', coach=self.admin_user)
+        response = self.post_events((self.team1, 2), (other, 2))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('team_id', response.data['errors']['events'][1])
+        response = self.post_events((self.team1, 0))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('points', response.data['errors']['events'][0])
+        response = self.client.post(self.events_url, [{'game_id': self.game.id, 'team_id': self.team1.id, 'points': 2}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error_code'], ERROR_CODES['INVALID_SCORE_EVENTS'])
+        self.assertFalse(ScoreEvent.objects.exists())
+
+    def test_finalize_game(self):
+        self.post_events((self.team1, 2), (self.team2, 2))
+        response = self.client.post(self.finalize_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        ScoreEvent.objects.create(game=self.game, team=self.team2, points=1)
+        response = self.client.post(self.finalize_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['team2_score'], response.data['winner']), (3, self.team2.id))
+        self.assertEqual(Standings.objects.get(team=self.team2).wins, 1)
+
+        response = self.post_events((self.team1, 3))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('game_id', response.data['errors']['events'][0])
+        self.assertEqual(self.client.post(self.finalize_url).status_code, status.HTTP_400_BAD_REQUEST)
+
+class QueryPlanTests(APITestCase):
+    """
+    The hot queries must be answered from an index. PostgreSQL is told to avoid sequential scans, which it prefers
+    on the small test tables, so a plan that still scans a table means no index can answer the query.
+    """
+
+    def setUp(self):
+        self.coach1 = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123', username='coach1', role='coach')
+        self.coach2 = User.objects.create_user(email='coach2@basketball.league.com', password='coach@123', username='coach2', role='coach')
+        self.team1 = Team.objects.create(name='Team 1', coach=self.coach1)
+        self.team2 = Team.objects.create(name='Team 2', coach=self.coach2)
+        Game.objects.create(team1=self.team1, team2=self.team2, team1_score=10, team2_score=8, date=now())
+        Player.objects.create(name='Player 1', height=6.0, team=self.team1)
+        LoginActivity.objects.create(user=self.coach1)
+
+    def get_plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = self.get_plan(queryset)
+        self.assertIn(index_name, plan)
+        self.assertNotRegex(plan, r'Seq Scan on|\bSCAN league_api_\w+$|\bSCAN league_api_\w+\n')
+
+    def test_open_session_of_a_user(self):
+        self.assertUsesIndex(LoginActivity.objects.filter(user=self.coach1, logout_time__isnull=True), 'loginactivity_open_idx')
+
+    def test_scoreboard_page(self):
+        self.assertUsesIndex(Game.objects.order_by('date', 'id')[:50], 'game_date_idx')
+        self.assertUsesIndex(Game.objects.filter(date__gt=now()).order_by('date', 'id')[:50], 'game_date_idx')
+
+    def test_recent_games_of_a_team(self):
+        self.assertUsesIndex(Game.objects.filter(team1=self.team1).order_by('-date', '-id'), 'game_team1_date_idx')
+        self.assertUsesIndex(Game.objects.filter(team2=self.team1).order_by('-date', '-id'), 'game_team2_date_idx')
+        # either side, the games are read from both indexes
+        plan = self.get_plan(Game.objects.filter(Q(team1=self.team1) | Q(team2=self.team1)).order_by('-date', '-id'))
+        self.assertNotRegex(plan, r'Seq Scan on|\bSCAN league_api_game$|\bSCAN league_api_game\n')
+
+    def test_players_of_a_team_by_score(self):
+        self.assertUsesIndex(Player.objects.filter(team=self.team1).order_by('-average_score'), 'player_team_score_idx')
+        self.assertUsesIndex(Player.objects.filter(team=self.team1, average_score__gte=10), 'player_team_score_idx')
+
 class RemovePlayerViewTests(APITestCase):
     def setUp(self):
         # Create a coach user
@@ -388,14 +1135,22 @@ class UpdateAVGTeamScoreViewTests(APITestCase):
 
         # Create test team data
         self.team = Team.objects.create(name='Team A', coach=self.user)
+        other_coach = User.objects.create_user(email='coach2@example.com', username='coach2', password='password123', role='coach')
+        other_team = Team.objects.create(name='Team B', coach=other_coach)
+        player = Player.objects.create(name='Player 1', team=self.team, height=6.0)
+        for points in (80, 91):
+            game = Game.objects.create(team1=self.team, team2=other_team, team1_score=points, team2_score=0, date=now())
+            PlayerGameStat.objects.create(player=player, game=game, team=self.team, points=points)
 
     def test_update_avg_team_score(self):
 
         url = reverse('update_avg_team_score')
         self.client.force_authenticate(user=self.user)
-        data = {'team_id': self.team.id, 'average_score': 85.5}
+        # the average follows the stat lines, not the submitted score
+        data = {'team_id': self.team.id, 'average_score': 10}
         response = self.client.put(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['average_score'], 85.5)
         self.team.refresh_from_db()
         self.assertEqual(self.team.average_score, 85.5)
 
@@ -422,17 +1177,22 @@ class UpdateAVGPlayerScoreViewTests(APITestCase):
         self.team = Team.objects.create(name='Team A', coach=self.coach_user)
         self.player = Player.objects.create(name='Player 1', team=self.team, height=6.0, user=self.player_user)
         self.player.refresh_from_db()
+        other_team = Team.objects.create(name='Team B', coach=self.user)
+        for points in (18, 22):
+            game = Game.objects.create(team1=self.team, team2=other_team, team1_score=points, team2_score=0, date=now())
+            PlayerGameStat.objects.create(player=self.player, game=game, team=self.team, points=points)
 
     def test_update_avg_player_score(self):
         player = Player.objects.get(id=self.player.id)
         url = reverse('update_avg_player_score')
         self.client.force_authenticate(user=self.user)
-        data = {'player_id': player.id, 'average_score': 20.0}
+        data = {'player_id': player.id, 'average_score': 5.0}
 
         response = self.client.put(url, data )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.player.refresh_from_db()
         self.assertEqual(self.player.average_score, 20.0)
+        self.assertEqual((self.player.total_points, self.player.scored_games), (40, 2))
 
     def test_update_avg_player_score_invalid_player(self):
 
@@ -440,4 +1200,531 @@ class UpdateAVGPlayerScoreViewTests(APITestCase):
         self.client.force_authenticate(user=self.user)
         data = {'player_id': 9999, 'average_score': 20.0}
         response = self.client.put(url, data)
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.put(url, {'average_score': 20.0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class PlayerGameStatTests(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(email='admin@basketball.league.com', password='admin@123',
+                                                        username='admin', role='admin')
+        self.coach1 = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123',
+                                               username='coach1', role='coach')
+        self.coach2 = User.objects.create_user(email='coach2@basketball.league.com', password='coach@123',
+                                               username='coach2', role='coach')
+        self.team1 = Team.objects.create(name='Team 1', coach=self.coach1)
+        self.team2 = Team.objects.create(name='Team 2', coach=self.coach2)
+        self.player1 = Player.objects.create(name='Player 1', height=6.0, team=self.team1)
+        self.player2 = Player.objects.create(name='Player 2', height=6.0, team=self.team1)
+        self.player3 = Player.objects.create(name='Player 3', height=6.0, team=self.team2)
+        self.games = [Game.objects.create(team1=self.team1, team2=self.team2, team1_score=0, team2_score=0, date=now()) for _ in range(2)]
+        self.client.force_authenticate(user=self.admin_user)
+
+    def record(self, game, *lines):
+        stats = [{'player_id': player.id, 'points': points, 'minutes': 30} for player, points in lines]
+        return self.client.post(reverse('record_game_stats'), {'game_id': game.id, 'stats': stats}, format='json')
+
+    def test_averages_follow_stat_lines(self):
+        response = self.record(self.games[0], (self.player1, 10), (self.player2, 20), (self.player3, 15))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        credit_roster_games_played(self.games[1].id, self.team1.id)
+        with CaptureQueriesContext(connection) as queries:
+            self.record(self.games[1], (self.player1, 20))
+        self.assertEqual(sum(query['sql'].startswith('UPDATE "league_api_player"') for query in queries), 1)
+
+        self.player1.refresh_from_db()
+        self.assertEqual((self.player1.average_score, self.player1.scored_games, self.player1.games_played), (15.0, 2, 2))
+        self.team1.refresh_from_db()
+        self.assertEqual((self.team1.average_score, self.team1.total_points, self.team1.scored_games), (25.0, 50, 2))
+        self.assertEqual(Team.objects.get(id=self.team2.id).average_score, 15.0)
+        response = self.client.get(reverse('leaderboard'), {'limit': 1})
+        self.assertEqual(response.data[0]['id'], self.player2.id)
+
+    def test_partial_roster_credit_covers_the_listed_players_only(self):
+        credit_roster_games_played(self.games[0].id, self.team1.id, [self.player1.id])
+        self.record(self.games[0], (self.player1, 10), (self.player2, 20))
+        games = dict(Player.objects.filter(team=self.team1).values_list('id', 'games_played'))
+        self.assertEqual(games, {self.player1.id: 1, self.player2.id: 1})
+
+    def test_invalid_stat_lines_are_rejected(self):
+        self.record(self.games[0], (self.player1, 10))
+        response = self.record(self.games[0], (self.player1, 12), (self.player2, 8))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors']['stats'][1], {})
+        other_team = Team.objects.create(name='Team 3', coach=self.admin_user)
+        outsider = Player.objects.create(name='Player 4', height=6.0, team=other_team)
+        response = self.record(self.games[1], (outsider, 4))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        stats = [{'player_id': self.player1.id, 'points': 4}]
+        for body in ({'game_id': 'abc', 'stats': stats}, [{'game_id': self.games[1].id, 'stats': stats}]):
+            response = self.client.post(reverse('record_game_stats'), body, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data['error_code'], ERROR_CODES['INVALID_GAME_STATS'])
+        self.assertEqual(PlayerGameStat.objects.count(), 1)
+
+    def test_recompute_matches_incremental_averages(self):
+        self.record(self.games[0], (self.player1, 10), (self.player2, 21), (self.player3, 15))
+        self.record(self.games[1], (self.player1, 7), (self.player3, 9))
+        fields = ('id', 'average_score', 'total_points', 'scored_games')
+        incremental = (list(Player.objects.order_by('id').values(*fields)), list(Team.objects.order_by('id').values(*fields)))
+
+        # player averages are left alone, the leaderboard histogram follows them
+        Player.objects.update(total_points=0, scored_games=0)
+        Team.objects.update(average_score=0.0, total_points=0, scored_games=0)
+        call_command('recompute_averages', stdout=StringIO())
+        recomputed = (list(Player.objects.order_by('id').values(*fields)), list(Team.objects.order_by('id').values(*fields)))
+        self.assertEqual(recomputed, incremental)
+
+    def test_recompute_without_stat_lines_resets_averages(self):
+        self.record(self.games[0], (self.player3, 10))
+        PlayerGameStat.objects.filter(player=self.player3).delete()
+        recompute_averages([self.player3.id], [self.team2.id])
+        fields = ('average_score', 'total_points', 'scored_games')
+        self.assertEqual(Player.objects.filter(id=self.player3.id).values_list(*fields).get(), (0.0, 0, 0))
+        self.assertEqual(Team.objects.filter(id=self.team2.id).values_list(*fields).get(), (0.0, 0, 0))
+
+
+class StandingsViewTests(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(email='admin@basketball.league.com', password='admin@123',
+                                                        username='admin', role='admin')
+        self.coach1 = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123',
+                                               username='coach1', role='coach')
+        self.coach2 = User.objects.create_user(email='coach2@basketball.league.com', password='coach@123',
+                                               username='coach2', role='coach')
+        self.team1 = Team.objects.create(name='Team 1', coach=self.coach1)
+        self.team2 = Team.objects.create(name='Team 2', coach=self.coach2)
+        self.client.force_authenticate(user=self.admin_user)
+
+    def play_game(self, team1_score, team2_score):
+        response = self.client.post(reverse('create_game'), {'team1_id': self.team1.id, 'team2_id': self.team2.id})
+        data = {'game_id': response.data['id'], 'team1_score': team1_score, 'team2_score': team2_score}
+        self.client.put(reverse('update_team_score'), data)
+        self.client.post(reverse('finalize_game', kwargs={'pk': response.data['id']}))
+
+    def test_standings_follow_score_updates(self):
+        self.play_game(80, 70)
+        self.play_game(90, 60)
+        self.play_game(50, 55)
+        # a game in progress counts its points, not a result
+        response = self.client.post(reverse('create_game'), {'team1_id': self.team1.id, 'team2_id': self.team2.id})
+        self.client.put(reverse('update_team_score'), {'game_id': response.data['id'], 'team1_score': 10, 'team2_score': 0})
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('standings'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['team'], self.team1.id)
+        self.assertEqual(response.data[0]['wins'], 2)
+        self.assertEqual(response.data[0]['losses'], 1)
+        self.assertEqual(response.data[0]['points_for'], 230)
+        self.assertEqual(response.data[0]['points_against'], 185)
+        self.assertEqual(response.data[0]['streak'], -1)
+        self.assertEqual(response.data[1]['streak'], 1)
+
+    def test_rebuild_standings_matches_incremental_updates(self):
+        self.play_game(80, 70)
+        self.play_game(90, 60)
+        incremental = list(Standings.objects.order_by('team').values())
+
+        Standings.objects.all().delete()
+        call_command('rebuild_standings', stdout=StringIO())
+        self.assertEqual(list(Standings.objects.order_by('team').values()), incremental)
+
+        out = StringIO()
+        call_command('rebuild_standings', '--check', stdout=out)
+        self.assertIn('consistent', out.getvalue())
+
+
+class LeaderboardTests(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(email='admin@basketball.league.com', password='admin@123',
+                                                        username='admin', role='admin')
+        self.client.force_authenticate(user=self.admin_user)
+        self.team = Team.objects.create(name='Team A', coach=self.admin_user)
+        self.players = [
+            Player.objects.create(name=f'Player {i}', height=6.0, team=self.team, average_score=score)
+            for i, score in enumerate([12.5, 30.0, 18.25, 18.25, 7.0, 25.1])
+        ]
+
+    def test_top_players(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('leaderboard'), {'limit': 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([player['average_score'] for player in response.data], [30.0, 25.1, 18.25, 18.25])
+        self.assertEqual([player['rank'] for player in response.data], [1, 2, 3, 3])
+
+        response = self.client.get(reverse('leaderboard'), {'limit': 'all'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rank_and_percentile_follow_player_writes(self):
+        player = self.players[0]
+        response = self.client.get(reverse('leaderboard_player', kwargs={'pk': player.id}))
+        self.assertEqual((response.data['rank'], response.data['total']), (5, 6))
+        self.assertEqual(response.data['percentile'], round(100 / 6, 2))
+
+        player.average_score = 26.0
+        player.save()
+        self.players[1].delete()
+        Player.objects.create(name='Player 7', height=6.0, team=self.team, average_score=26.0)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('leaderboard_player', kwargs={'pk': player.id}))
+        self.assertEqual((response.data['rank'], response.data['total']), (1, 6))
+        response = self.client.get(reverse('leaderboard_percentile'), {'score': 20})
+        self.assertEqual(response.data, {'score': 20.0, 'rank': 4, 'percentile': 50.0, 'total': 6})
+
+    def test_rebuild_leaderboard_matches_incremental_updates(self):
+        self.players[2].average_score = 3.0
+        self.players[2].save()
+        self.team.delete()
+        Player.objects.create(name='Player 8', height=6.0, average_score=9.95,
+                              team=Team.objects.create(name='Team B', coach=self.admin_user))
+        incremental = list(LeaderboardBucket.objects.filter(players__gt=0).order_by('bucket').values())
+
+        call_command('rebuild_leaderboard', stdout=StringIO())
+        self.assertEqual(list(LeaderboardBucket.objects.order_by('bucket').values()), incremental)
+        self.assertEqual(incremental, [{'bucket': 99, 'players': 1}])
+
+class LiveScoresViewTests(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(email='admin@basketball.league.com', password='admin@123',
+                                                        username='admin', role='admin')
+        self.coach1 = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123',
+                                               username='coach1', role='coach')
+        self.coach2 = User.objects.create_user(email='coach2@basketball.league.com', password='coach@123',
+                                               username='coach2', role='coach')
+        self.team1 = Team.objects.create(name='Team 1', coach=self.coach1)
+        self.team2 = Team.objects.create(name='Team 2', coach=self.coach2)
+        self.game = Game.objects.create(team1=self.team1, team2=self.team2, team1_score=0, team2_score=0, date=now())
+        self.token = Token.objects.create(user=self.admin_user)
+
+    def test_broadcaster_delivers_to_matching_subscriptions_once(self):
+        async def scenario():
+            broadcaster = InProcessBroadcaster()
+            league = broadcaster.subscribe([LEAGUE_CHANNEL, game_channel(1)])
+            other_game = broadcaster.subscribe([game_channel(2)])
+            publisher = threading.Thread(target=broadcaster.publish, args=([LEAGUE_CHANNEL, game_channel(1)], {'game_id': 1}))
+            publisher.start()
+            publisher.join()
+            received = await league.get(timeout=1)
+            duplicate = await league.get(timeout=0.05)
+            unrelated = await other_game.get(timeout=0.05)
+            broadcaster.unsubscribe(league)
+            broadcaster.unsubscribe(other_game)
+            return received, duplicate, unrelated
+
+        self.assertEqual(asyncio.run(scenario()), ({'game_id': 1}, None, None))
+
+    async def test_stream_pushes_score_updates(self):
+        url = reverse('live_game_scores', kwargs={'pk': self.game.id})
+        response = await self.async_client.get(url, headers={'Authorization': f'Token {self.token.key}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        events = aiter(response.streaming_content)
+        self.assertTrue((await anext(events)).startswith(b'retry:'))
+        get_broadcaster().publish([game_channel(self.game.id)], {'game_id': self.game.id, 'team1_score': 2})
+        event = await asyncio.wait_for(anext(events), timeout=1)
+        self.assertEqual(event, f'event: score\ndata: {{"game_id": {self.game.id}, "team1_score": 2}}\n\n'.encode())
+        await events.aclose()
+
+    def test_stream_requires_asgi(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get(reverse('live_scores'), HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_score_update_is_published_after_commit(self):
+        self.client.force_authenticate(user=self.admin_user)
+        with mock.patch('league_api.views.publish_score_update') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.put(reverse('update_team_score'), {'game_id': self.game.id, 'team1_score': 7, 'team2_score': ''})
+        publish.assert_called_once_with(self.game.id, {'team1_score': 7})
+
+
+class ExportViewTests(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(email='admin@basketball.league.com', password='admin@123',
+                                                        username='admin', role='admin')
+        self.coach1 = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123',
+                                               username='coach1', role='coach')
+        self.coach2 = User.objects.create_user(email='coach2@basketball.league.com', password='coach@123',
+                                               username='coach2', role='coach')
+        self.team1 = Team.objects.create(name='Team 1', coach=self.coach1)
+        self.team2 = Team.objects.create(name='Team 2', coach=self.coach2)
+        self.game = Game.objects.create(team1=self.team1, team2=self.team2, team1_score=40, team2_score=30, date=now())
+        self.player = Player.objects.create(name='Player, 1', height=6.0, team=self.team1)
+        self.client.force_authenticate(user=self.admin_user)
+
+    def test_export_games_as_ndjson(self):
+        response = self.client.get(reverse('export', kwargs={'resource': 'games'}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['team1_score'], 40)
+        self.assertEqual(rows[0]['team1_id'], self.team1.id)
+
+    def test_export_players_as_csv(self):
+        response = self.client.get(reverse('export', kwargs={'resource': 'players'}), {'output': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,name,user_id,team_id,height,average_score,games_played')
+        self.assertEqual(lines[1], f'{self.player.id},"Player, 1",,{self.team1.id},6.0,0.0,0')
+
+    def test_export_rejects_unknown_format_and_resource(self):
+        response = self.client.get(reverse('export', kwargs={'resource': 'games'}), {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('export', kwargs={'resource': 'passwords'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_export_is_admin_only(self):
+        self.client.force_authenticate(user=self.coach1)
+        response = self.client.get(reverse('export', kwargs={'resource': 'games'}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command('export_data', 'teams', '--format', 'csv', stdout=out)
+        self.assertEqual(out.getvalue().splitlines()[1:], [f'{self.team1.id},Team 1,{self.coach1.id},0.0', f'{self.team2.id},Team 2,{self.coach2.id},0.0'])
+
+
+class SiteStatisticsViewTests(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(email='admin@basketball.league.com', password='admin@123',
+                                                        username='admin', role='admin', login_count=1)
+        self.coach = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123',
+                                              username='coach1', role='coach', login_count=3)
+        self.player = User.objects.create_user(email='player1@basketball.league.com', password='player@123',
+                                               username='player1', role='player', login_count=2)
+        # the coach logged in twice and is still online, the player logged out
+        LoginActivity.objects.create(user=self.coach, logout_time=now())
+        LoginActivity.objects.create(user=self.coach)
+        OnlineSession.objects.create(user=self.coach, since=now())
+        LoginActivity.objects.create(user=self.player, logout_time=now())
+        self.url = reverse('site_statistics')
+        self.client.force_authenticate(user=self.admin_user)
+
+    def test_statistics_run_in_a_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        online = {row['username']: row['is_online'] for row in response.data['results']}
+        self.assertEqual(online, {'admin': False, 'coach1': True, 'player1': False})
+
+    def test_statistics_filters(self):
+        response = self.client.get(self.url, {'is_online': 'false', 'min_login_count': 2})
+        self.assertEqual([row['username'] for row in response.data['results']], ['player1'])
+        response = self.client.get(self.url, {'role': 'coach'})
+        self.assertEqual([row['username'] for row in response.data['results']], ['coach1'])
+        response = self.client.get(self.url, {'role': 'referee'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_statistics_pagination(self):
+        first_page = self.client.get(self.url, {'page_size': 2})
+        second_page = self.client.get(first_page.data['next'])
+        usernames = [row['username'] for row in first_page.data['results'] + second_page.data['results']]
+        self.assertEqual(usernames, ['admin', 'coach1', 'player1'])
+
+
+@override_settings(LOGIN_ACTIVITY_SYNC=True)
+class OnlineUsersViewTests(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(email='admin@basketball.league.com', password='admin@123',
+                                                        username='admin', role='admin')
+        self.coach = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123',
+                                              username='coach1', role='coach')
+
+    def test_presence_follows_login_and_logout(self):
+        response = self.client.post(reverse('api_token_auth'), {'username': 'coach1', 'password': 'coach@123'})
+        coach_token = response.data['token']
+        self.client.post(reverse('api_token_auth'), {'username': 'coach1', 'password': 'coach@123'})
+
+        self.client.force_authenticate(user=self.admin_user)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('online_users'))
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['users'][0]['username'], 'coach1')
+
+        self.client.force_authenticate(user=None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {coach_token}')
+        self.client.post(reverse('api_token_logout'))
+
+        self.client.credentials()
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get(reverse('online_users'))
+        self.assertEqual(response.data, {'count': 0, 'users': []})
+
+
+@override_settings(LOGIN_ACTIVITY_SYNC=False, LOGIN_ACTIVITY_BUFFER_SIZE=2, LOGIN_ACTIVITY_FLUSH_INTERVAL=60)
+class LoginTelemetryTests(APITestCase):
+    def setUp(self):
+        self.coach = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123',
+                                              username='coach1', role='coach')
+        self.addCleanup(flush_login_activity)
+
+    def login(self):
+        return self.client.post(reverse('api_token_auth'), {'username': 'coach1', 'password': 'coach@123'}).data['token']
+
+    def test_login_activity_is_flushed_in_batches(self):
+        self.login()
+        self.assertEqual(LoginActivity.objects.count(), 0)
+        self.coach.refresh_from_db()
+        self.assertEqual(self.coach.login_count, 1)
+
+        self.login()
+        self.assertEqual(LoginActivity.objects.count(), 2)
+
+    @override_settings(LOGIN_ACTIVITY_BUFFER_SIZE=10)
+    def test_failed_rows_do_not_fail_the_flush(self):
+        player = User.objects.create_user(email='player1@basketball.league.com', password='player@123', username='player1', role='player')
+        for user in (self.coach, player):
+            OnlineSession.objects.create(user=user, since=now())
+            record_login_activity(user, now())
+        # the foreign key of a user deleted since the login fails the batch, then the row
+        save = LoginActivity.save
+        def save_unless_deleted(activity, *args, **kwargs):
+            if activity.user_id == player.id:
+                raise IntegrityError('foreign key violation')
+            return save(activity, *args, **kwargs)
+        with mock.patch.object(LoginActivity.objects, 'bulk_create', side_effect=IntegrityError('foreign key violation')), \
+                mock.patch.object(LoginActivity, 'save', save_unless_deleted):
+            self.assertEqual(flush_login_activity(), 1)
+        self.assertEqual(list(LoginActivity.objects.values_list('user', flat=True)), [self.coach.id])
+
+        OnlineSession.objects.filter(user=self.coach).update(since=now())
+        record_login_activity(self.coach, now())
+        with mock.patch.object(LoginActivity.objects, 'bulk_create', side_effect=OperationalError('database unavailable')):
+            self.assertEqual(flush_login_activity(), 0)
+        self.assertEqual(flush_login_activity(), 1)
+        self.assertEqual(LoginActivity.objects.count(), 2)
+
+    def test_logout_closes_buffered_session(self):
+        token = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        self.client.post(reverse('api_token_logout'))
+
+        activity = LoginActivity.objects.get(user=self.coach)
+        self.coach.refresh_from_db()
+        self.assertIsNotNone(activity.logout_time)
+        self.assertEqual(self.coach.total_time_spent, activity.logout_time - activity.login_time)
+
+    def test_logout_of_a_login_buffered_by_another_worker(self):
+        token = self.login()
+        # the login row is still in the buffer of the worker that served the login
+        since = OnlineSession.objects.get(user=self.coach).since
+        get_login_activity_buffer().pending.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        self.client.post(reverse('api_token_logout'))
+
+        activity = LoginActivity.objects.get(user=self.coach)
+        self.coach.refresh_from_db()
+        self.assertEqual(activity.login_time, since)
+        self.assertEqual(self.coach.total_time_spent, activity.logout_time - since)
+        self.assertFalse(OnlineSession.objects.filter(user=self.coach).exists())
+
+        # that worker flushing the stale row later records nothing more
+        record_login_activity(self.coach, since)
+        self.assertEqual(flush_login_activity(), 0)
+        self.assertEqual(LoginActivity.objects.count(), 1)
+
+
+class ActivityRollupTests(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(email='admin@basketball.league.com', password='admin@123',
+                                                        username='admin', role='admin')
+        self.coach1 = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123',
+                                               username='coach1', role='coach')
+        self.coach2 = User.objects.create_user(email='coach2@basketball.league.com', password='coach@123',
+                                               username='coach2', role='coach')
+        self.day = datetime(2024, 3, 1, tzinfo=timezone.utc)
+        self.add_session(self.coach1, 10, 60)
+        self.add_session(self.coach2, 10.5, 30)
+        self.add_session(self.coach1, 13, 15)
+        self.client.force_authenticate(user=self.admin_user)
+
+    def add_session(self, user, hour, minutes):
+        login_time = self.day + timedelta(hours=hour)
+        activity = LoginActivity.objects.create(user=user, logout_time=login_time + timedelta(minutes=minutes))
+        LoginActivity.objects.filter(id=activity.id).update(login_time=login_time)
+        return activity
+
+    def test_rollups_are_incremental_and_read_by_the_statistics(self):
+        call_command('rollup_login_activity', '--no-prune', stdout=StringIO())
+        self.add_session(self.coach2, 20, 10)
+        call_command('rollup_login_activity', '--no-prune', stdout=StringIO())
+        call_command('rollup_login_activity', '--no-prune', stdout=StringIO())
+
+        day = LoginActivityRollup.objects.get(granularity='day', role='coach', user__isnull=True)
+        self.assertEqual(day.session_count, 4)
+        self.assertEqual(day.total_duration, timedelta(minutes=115))
+        self.assertEqual(day.max_concurrency, 2)
+        per_user = LoginActivityRollup.objects.get(granularity='day', user=self.coach1)
+        self.assertEqual(per_user.session_count, 2)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('activity_rollups'), {'granularity': 'hour', 'role': 'coach'})
+        self.assertEqual([row['session_count'] for row in response.data], [2, 1, 1])
+
+        response = self.client.get(reverse('activity_rollups'), {'start': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_prune_removes_only_rolled_up_sessions_past_retention(self):
+        open_session = LoginActivity.objects.create(user=self.coach1)
+        LoginActivity.objects.filter(id=open_session.id).update(login_time=self.day)
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            archive = os.path.join(directory, 'login-activity.ndjson')
+            call_command('rollup_login_activity', '--retention-days', '30', '--archive', archive, stdout=out)
+            with open(archive) as archived:
+                self.assertEqual(len(archived.readlines()), 3)
+        self.assertIn('3 sessions pruned', out.getvalue())
+        self.assertEqual(list(LoginActivity.objects.values_list('id', flat=True)), [open_session.id])
+
+
+class EngagementViewTests(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(email='admin@basketball.league.com', password='admin@123',
+                                                        username='admin', role='admin')
+        self.coach1 = User.objects.create_user(email='coach1@basketball.league.com', password='coach@123',
+                                               username='coach1', role='coach')
+        self.coach2 = User.objects.create_user(email='coach2@basketball.league.com', password='coach@123',
+                                               username='coach2', role='coach')
+        self.player = User.objects.create_user(email='player1@basketball.league.com', password='player@123',
+                                               username='player1', role='player')
+        self.day = (now() - timedelta(days=10)).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.add_session(self.coach1, 10, 60)
+        self.add_session(self.coach2, 10.5, 30)
+        self.add_session(self.coach1, 13, 15)
+        self.add_session(self.player, 12, None)
+        self.add_session(self.coach1, 24 + 9, 10)
+        self.client.force_authenticate(user=self.admin_user)
+
+    def add_session(self, user, hour, minutes):
+        login_time = self.day + timedelta(hours=hour)
+        logout_time = None if minutes is None else login_time + timedelta(minutes=minutes)
+        activity = LoginActivity.objects.create(user=user, logout_time=logout_time)
+        LoginActivity.objects.filter(id=activity.id).update(login_time=login_time)
+
+    def test_engagement_timeline(self):
+        params = {'start': self.day.isoformat(), 'end': (self.day + timedelta(days=1)).isoformat()}
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('engagement'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [
+            {'day': self.day.date(), 'role': 'coach', 'daily_active_users': 2, 'peak_concurrent_sessions': 2,
+             'session_length_p50': 1800.0, 'session_length_p90': 3600.0, 'session_length_p99': 3600.0},
+            {'day': self.day.date(), 'role': 'player', 'daily_active_users': 1, 'peak_concurrent_sessions': 1,
+             'session_length_p50': None, 'session_length_p90': None, 'session_length_p99': None},
+        ])
+
+    def test_engagement_rejects_malformed_dates(self):
+        response = self.client.get(reverse('engagement'), {'start': 'last week'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(LOGIN_ACTIVITY_RETENTION_DAYS=5)
+    def test_engagement_rejects_days_past_the_retention_window(self):
+        response = self.client.get(reverse('engagement'), {'start': self.day.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error_code'], ERROR_CODES['ENGAGEMENT_RANGE_NOT_RETAINED'])
+        response = self.client.get(reverse('engagement'), {'start': (self.day + timedelta(days=8)).replace(tzinfo=None).isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
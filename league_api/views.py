@@ -1,26 +1,70 @@
+import codecs
+import csv
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
-from rest_framework.exceptions import PermissionDenied
-from django.db import IntegrityError
-from django.utils.timezone import now
-from .serializers import GameSerializer, PlayerSerializer, TeamSerializer, RegisterUserSerializer, InitialTeamSerializer
-from .models import Game, Team, Player, User
-from .services import get_site_statistics, calculate_90th_percentile, record_logout_and_calculate_time_spent, update_login_count_and_activity
+from rest_framework.exceptions import PermissionDenied, NotFound, ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.parsers import MultiPartParser
+from rest_framework.settings import api_settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from datetime import timedelta
+from django.utils.timezone import is_naive, make_aware, now
+from django.utils.dateparse import parse_datetime
+from .serializers import GameSerializer, PlayerSerializer, TeamSerializer, RegisterUserSerializer, InitialTeamSerializer, StandingsSerializer, GameScoreUpdateSerializer, GameStatsSerializer, ScoreEventBatchSerializer
+from .models import Game, Team, Player, User, Standings, PlayerGameStat, ScoreEvent
+from .services import get_site_statistics, filter_by_percentile, record_logout_and_calculate_time_spent, update_login_count_and_activity, get_game_result, update_standings, update_standings_for_games, get_online_users, credit_roster_games_played, reserve_team_slot
 from .permissions import IsAuthenticatedOr401, IsAdmin, IsCoach, IsPlayer, IsAdminOrIsCoach
-from .constants import USERS, ERROR_CODES
-
+from .pagination import ScoreboardCursorPagination, SiteStatisticsCursorPagination
+from .cache import bump_games_version, get_scoreboard_cache_key, get_cached_scoreboard, set_cached_scoreboard, get_object_cache_key, get_cached_object, set_cached_object, get_cache_stats
+from .broadcast import LEAGUE_CHANNEL, game_channel, publish_score_update, stream_score_events
+from .renderers import EventStreamRenderer, MessagePackRenderer
+from .representations import GAME_FIELDS, PLAYER_FIELDS, is_default_representation, represent_games, represent_player, represent_teams
+from .exports import EXPORTS, EXPORT_FORMATS, iter_export
+from .rollups import GRANULARITIES, get_activity_rollups
+from .analytics import get_engagement_timeline
+from .authentication import cache_token, get_identity, load_identity
+from .registrations import REGISTRATION_FIELDS, register_users
+from .stats import record_game_stats, recompute_averages
+from .scoring import fold_score_events, finalize_game
+from .leaderboard import get_top_players, get_player_rank, get_score_position, get_percentile
+from .constants import USERS, ERROR_CODES, DEFAULT_PASSWORDS
+
+
+def parse_datetime_param(request, name):
+    # missing parameters are None, malformed ones raise ValueError
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'{name} is not a valid datetime')
+    # values without an offset are in the current time zone, like the ones Django reads from forms
+    return make_aware(parsed) if is_naive(parsed) else parsed
 
 # user login with django auth
 class CustomAuthToken(ObtainAuthToken):
+    # ObtainAuthToken only speaks JSON and forms, login negotiates like the other endpoints
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES
+
     def post(self, request, *args, **kwargs):
-        response = super().post(request, *args, **kwargs)
-        token = Token.objects.get(key=response.data['token'])
-        update_login_count_and_activity(token.user)
-        return response
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        token, created = Token.objects.get_or_create(user=user)
+        identity = load_identity(user)
+        update_login_count_and_activity(user, identity.team_id)
+        # the first authenticated request after login is served from the token cache
+        cache_token(token.key, user, identity)
+        return Response({'token': token.key})
 
 # user logout and past token will be invalid
 class LogoutView(APIView):
@@ -29,8 +73,9 @@ class LogoutView(APIView):
 
     def post(self, request):
         try:
-            token = Token.objects.get(user=request.user)
-            record_logout_and_calculate_time_spent(request.user)
+            # the token authenticating the request, force authenticated requests (tests) have none
+            token = request.auth if isinstance(request.auth, Token) else Token.objects.get(user=request.user)
+            record_logout_and_calculate_time_spent(request.user, get_identity(request).team_id)
             token.delete()
             return Response({'detail': 'User logged out successfully.'}, status=status.HTTP_200_OK)
         except:
@@ -48,9 +93,44 @@ class ScoreboardView(generics.ListAPIView):
     
     permission_classes = [IsAuthenticatedOr401]
     serializer_class = GameSerializer
+    pagination_class = ScoreboardCursorPagination
 
     def get_queryset(self):
-        return Game.objects.all()
+        # only the requested relations are joined or prefetched, the paginator needs the ordering columns
+        return self.get_serializer().optimize_queryset(Game.objects.all(), required_fields=self.pagination_class.ordering)
+
+    def list(self, request, *args, **kwargs):
+        # pages are cached per games version, any game write moves every page to a new key
+        cache_key = get_scoreboard_cache_key(request)
+        data = get_cached_scoreboard(cache_key)
+        if data is not None:
+            return Response(data)
+
+        if is_default_representation(request):
+            paginator = self.paginator
+            rows = paginator.paginate_queryset(Game.objects.values(*GAME_FIELDS), request, view=self)
+            response = paginator.get_paginated_response(represent_games(rows))
+        else:
+            response = super().list(request, *args, **kwargs)
+        set_cached_scoreboard(cache_key, response.data)
+        return response
+
+# all users can follow live score updates of the league or of a single game
+class LiveScoresView(APIView):
+
+    permission_classes = [IsAuthenticatedOr401]
+    renderer_classes = [EventStreamRenderer, JSONRenderer, MessagePackRenderer]
+
+    def get(self, request, pk=None):
+        # the stream never ends, only the ASGI application can serve it without holding a worker
+        if not isinstance(request._request, ASGIRequest):
+            return Response({'detail': 'Live scores are only served over ASGI.', 'error_code': ERROR_CODES['LIVE_SCORES_REQUIRE_ASGI']}, status=status.HTTP_400_BAD_REQUEST)
+
+        channel = game_channel(pk) if pk else LEAGUE_CHANNEL
+        response = StreamingHttpResponse(stream_score_events([channel]), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
 
 # get details of given player
 class PlayerDetailView(generics.RetrieveAPIView):
@@ -59,7 +139,20 @@ class PlayerDetailView(generics.RetrieveAPIView):
     serializer_class = PlayerSerializer
 
     def get_queryset(self):
-        return Player.objects.filter(id=self.kwargs['pk'])
+        return self.get_serializer().optimize_queryset(Player.objects.filter(id=self.kwargs['pk']))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not is_default_representation(request):
+            return super().retrieve(request, *args, **kwargs)
+        cache_key = get_object_cache_key('players', self.kwargs['pk'])
+        player = get_cached_object('players', cache_key)
+        if player is None:
+            row = Player.objects.filter(id=self.kwargs['pk']).values(*PLAYER_FIELDS).first()
+            if row is None:
+                raise NotFound()
+            player = represent_player(row)
+            set_cached_object(cache_key, player)
+        return Response(player)
     
 # get details of players
 class PlayerListView(generics.ListAPIView):
@@ -68,39 +161,47 @@ class PlayerListView(generics.ListAPIView):
     serializer_class = PlayerSerializer
 
     def get_queryset(self):
-        user = self.request.user
+        identity = get_identity(self.request)
         team_id = self.kwargs.get('pk')
-        if user.role == USERS['COACH'] and hasattr(user, 'team'):
-            if user.team.id != team_id:
+        if identity.role == USERS['COACH'] and identity.team_id is not None:
+            if identity.team_id != team_id:
                 raise PermissionDenied("You do not have permission to view this team's players.")
-            
-        team = get_object_or_404(Team, id=self.kwargs['pk'])
+        # the coach's own team exists, any other team is looked up
+        elif not Team.objects.filter(id=team_id).exists():
+            raise NotFound()
+
         is_percentile_90 = self.request.query_params.get('is_percentile_90', 'true')
-        players = team.players.all()
+        players = Player.objects.filter(team_id=team_id)
+
+        players = self.get_serializer().optimize_queryset(players)
 
         if is_percentile_90.lower() == 'false':
             return players
 
-        # Collect individual average scores of all players in the team
-        average_scores = list(players.values_list('average_score', flat=True))
-        if average_scores:
-            # Calculate the 90th percentile score
-            percentile_90 = calculate_90th_percentile(average_scores)
+        try:
+            percentile = float(self.request.query_params.get('percentile', 90))
+        except ValueError:
+            percentile = None
+        if percentile is None or not 0 <= percentile <= 100:
+            raise ParseError('Percentile must be a number between 0 and 100.')
 
-            # Filter players whose average score is in the 90th percentile
-            filtered_players = players.filter(average_score__gte=percentile_90)
-            return filtered_players
-        else:
-            return players.none()
+        # Filter players whose average score reaches the percentile, computed by the database in the same query
+        return filter_by_percentile(players, 'average_score', percentile)
 
 # get list of team
 class TeamListView(generics.ListAPIView):
 
     permission_classes = [IsAuthenticatedOr401, IsAdmin]
-
-    queryset = Team.objects.all()
     serializer_class = TeamSerializer
 
+    def get_queryset(self):
+        return self.get_serializer().optimize_queryset(Team.objects.all())
+
+    def list(self, request, *args, **kwargs):
+        if not is_default_representation(request):
+            return super().list(request, *args, **kwargs)
+        return Response(list(represent_teams(Team.objects.all()).values()))
+
 # get details of given team
 class TeamDetailView(generics.RetrieveAPIView):
 
@@ -109,17 +210,163 @@ class TeamDetailView(generics.RetrieveAPIView):
 
     def get_queryset(self):
         team = Team.objects.filter(id=self.kwargs['pk'])
-        return team
+        return self.get_serializer().optimize_queryset(team)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not is_default_representation(request):
+            return super().retrieve(request, *args, **kwargs)
+        cache_key = get_object_cache_key('teams', self.kwargs['pk'])
+        team = get_cached_object('teams', cache_key)
+        if team is None:
+            team = represent_teams(Team.objects.filter(id=self.kwargs['pk'])).get(self.kwargs['pk'])
+            if team is None:
+                raise NotFound()
+            set_cached_object(cache_key, team)
+        # checked on cached payloads as well, the object permission only reads the primary key
+        self.check_object_permissions(request, Team(pk=team['id']))
+        return Response(team)
+
+# all users can see the league standings
+class StandingsView(generics.ListAPIView):
+
+    permission_classes = [IsAuthenticatedOr401]
+    serializer_class = StandingsSerializer
+
+    def get_queryset(self):
+        standings = Standings.objects.order_by('-wins', 'losses', 'team')
+        return self.get_serializer().optimize_queryset(standings)
+
+# all users can see the best players of the league
+class LeaderboardView(APIView):
+
+    permission_classes = [IsAuthenticatedOr401]
+    max_limit = 100
+
+    def get(self, request):
+        limit = request.query_params.get('limit', '10')
+        if not limit.isdigit() or not 0 < int(limit) <= self.max_limit:
+            return Response({'detail': 'Invalid leaderboard query.', 'error_code': ERROR_CODES['INVALID_LEADERBOARD_QUERY']}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(get_top_players(int(limit)))
+
+# all users can look up the league rank of a player
+class LeaderboardPlayerView(APIView):
+
+    permission_classes = [IsAuthenticatedOr401]
+
+    def get(self, request, pk):
+        player = get_object_or_404(Player.objects.only('name', 'team', 'average_score'), pk=pk)
+        return Response(get_player_rank(player))
+
+# all users can see which percentile of the league a score reaches
+class LeaderboardPercentileView(APIView):
+
+    permission_classes = [IsAuthenticatedOr401]
+
+    def get(self, request):
+        try:
+            score = float(request.query_params['score'])
+        except (KeyError, ValueError):
+            return Response({'detail': 'Invalid leaderboard query.', 'error_code': ERROR_CODES['INVALID_LEADERBOARD_QUERY']}, status=status.HTTP_400_BAD_REQUEST)
+        above, below, total = get_score_position(score)
+        return Response({'score': score, 'rank': above + 1, 'percentile': get_percentile(below, total), 'total': total})
 
 # admin can view details users
 class SiteStatisticsView(APIView):
 
     permission_classes = [IsAuthenticatedOr401, IsAdmin]
+    pagination_class = SiteStatisticsCursorPagination
 
     def get(self, request):
-        data = get_site_statistics()
-        return Response(data)
+        role = request.query_params.get('role')
+        is_online = request.query_params.get('is_online')
+        min_login_count = request.query_params.get('min_login_count')
+        if (role is not None and role not in USERS.values()) or \
+                (is_online is not None and is_online.lower() not in ('true', 'false')) or \
+                (min_login_count is not None and not min_login_count.isdigit()):
+            return Response({'detail': 'Invalid statistics filter.', 'error_code': ERROR_CODES['INVALID_STATISTICS_FILTER']}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = get_site_statistics(
+            role=role,
+            is_online=None if is_online is None else is_online.lower() == 'true',
+            min_login_count=None if min_login_count is None else int(min_login_count),
+        )
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(data, request, view=self)
+        return paginator.get_paginated_response(page)
     
+# admin can view login activity per hour or day and role, read from the rollups
+class ActivityRollupView(APIView):
+
+    permission_classes = [IsAuthenticatedOr401, IsAdmin]
+
+    def get(self, request):
+        granularity = request.query_params.get('granularity', 'day')
+        role = request.query_params.get('role')
+        try:
+            start = parse_datetime_param(request, 'start')
+            end = parse_datetime_param(request, 'end')
+            valid = granularity in GRANULARITIES and (role is None or role in USERS.values())
+        except ValueError:
+            valid = False
+        if not valid:
+            return Response({'detail': 'Invalid statistics filter.', 'error_code': ERROR_CODES['INVALID_STATISTICS_FILTER']}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(get_activity_rollups(granularity, start=start, end=end, role=role))
+
+# admin can view daily active users, peak concurrency and session lengths per role
+class EngagementView(APIView):
+
+    permission_classes = [IsAuthenticatedOr401, IsAdmin]
+
+    def get(self, request):
+        try:
+            end = parse_datetime_param(request, 'end') or now()
+            start = parse_datetime_param(request, 'start') or end - timedelta(days=30)
+        except ValueError:
+            return Response({'detail': 'Invalid statistics filter.', 'error_code': ERROR_CODES['INVALID_STATISTICS_FILTER']}, status=status.HTTP_400_BAD_REQUEST)
+        # raw sessions past the retention window are pruned by the rollups, only activity-rollups/ covers those days
+        if start < now() - timedelta(days=settings.LOGIN_ACTIVITY_RETENTION_DAYS):
+            return Response({'detail': f'Engagement is only kept for the last {settings.LOGIN_ACTIVITY_RETENTION_DAYS} days, older days are served by the activity rollups.', 'error_code': ERROR_CODES['ENGAGEMENT_RANGE_NOT_RETAINED']}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(get_engagement_timeline(start, end))
+
+# admin can see who is online right now
+class OnlineUsersView(APIView):
+
+    permission_classes = [IsAuthenticatedOr401, IsAdmin]
+
+    def get(self, request):
+        users = get_online_users()
+        return Response({'count': len(users), 'users': users})
+
+# admin can view the hit/miss counters of the server side caches
+class CacheStatsView(APIView):
+
+    permission_classes = [IsAuthenticatedOr401, IsAdmin]
+
+    def get(self, request):
+        return Response(get_cache_stats())
+
+# admin can stream full exports of games, players, teams and login activity
+class ExportView(APIView):
+
+    permission_classes = [IsAuthenticatedOr401, IsAdmin]
+
+    def perform_content_negotiation(self, request, force=False):
+        # exports are streamed as is, the renderers are only used for error responses
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, resource):
+        if resource not in EXPORTS:
+            raise NotFound('Unknown export.')
+        export_format = request.query_params.get('output', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response({'detail': 'Unsupported export format.', 'error_code': ERROR_CODES['INVALID_EXPORT_FORMAT']}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(iter_export(resource, export_format), content_type=EXPORT_FORMATS[export_format])
+        response['Content-Disposition'] = f'attachment; filename="{resource}.{export_format}"'
+        return response
+
 ## Post Calls
 # register coach by admin
 class RegisterCaochView(APIView):
@@ -129,7 +376,7 @@ class RegisterCaochView(APIView):
 
     def post(self, request, *args, **kwargs):
         try:
-            coach = User.objects.create_user(email=request.data['email'], password='coach@123',
+            coach = User.objects.create_user(email=request.data['email'], password=DEFAULT_PASSWORDS['coach'],
                                      username=request.data['username'],
                                      role='coach')
             coach_serializer = self.serializer_class(coach)
@@ -153,7 +400,7 @@ class RegisterPlayerView(APIView):
 
     def post(self, request, *args, **kwargs):
         try:
-            player = User.objects.create_user(email=request.data['email'], password='player@123',
+            player = User.objects.create_user(email=request.data['email'], password=DEFAULT_PASSWORDS['player'],
                                      username=request.data['username'],
                                      role='player')
             player_serializer = self.serializer_class(player)
@@ -169,6 +416,27 @@ class RegisterPlayerView(APIView):
 
         return Response(player_serializer.data, status=status.HTTP_201_CREATED)
 
+# register coaches and players by an admin from a CSV file with username, email and role columns
+class BulkRegisterView(APIView):
+
+    permission_classes = [IsAuthenticatedOr401, IsAdmin]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        rows = csv.DictReader(codecs.iterdecode(upload, 'utf-8-sig')) if upload else None
+        try:
+            valid = rows is not None and set(REGISTRATION_FIELDS) <= set(rows.fieldnames or ())
+            # the passwords are hashed by the pool of the process, started once instead of on every upload
+            report = list(register_users(rows, shared_pool=True)) if valid else None
+        except (UnicodeDecodeError, csv.Error):
+            report = None
+        if report is None:
+            return Response({'detail': f'Upload a UTF-8 CSV file with the columns {", ".join(REGISTRATION_FIELDS)}.', 'error_code': ERROR_CODES['INVALID_REGISTRATION_FILE']}, status=status.HTTP_400_BAD_REQUEST)
+
+        created = sum(row['status'] == 'created' for row in report)
+        return Response({'created': created, 'failed': len(report) - created, 'rows': report}, status=status.HTTP_200_OK)
+
 # coach create teams
 class CreateTeamView(APIView):
 
@@ -194,20 +462,23 @@ class JoinTeamView(APIView):
 
     def post(self, request, *args, **kwargs):
         try:
-            team = Team.objects.get(id=request.data['team_id'])
-
-            # Check if the team already has 10 players
-            if team.players.count() >= 10:
-                return Response({'detail': 'This team already has 10 players.', 'error_code': ERROR_CODES['INVALID_PLAYER_COUNT']}, status=status.HTTP_400_BAD_REQUEST)
-
-            Player.objects.create(
-                name=request.data['player_name'],
-                height=request.data['height'],
-                games_played=0,
-                average_score=0.0,
-                team=team,
-                user=request.user  # Linking Player to the User
-            )
+            with transaction.atomic():
+                # reserving the slot checks the cap and counts the player in one UPDATE, a failed insert releases it
+                if not reserve_team_slot(request.data['team_id']):
+                    if not Team.objects.filter(id=request.data['team_id']).exists():
+                        raise NotFound('Team not found.')
+                    return Response({'detail': f'This team already has {settings.TEAM_MAX_PLAYERS} players.', 'error_code': ERROR_CODES['INVALID_PLAYER_COUNT']}, status=status.HTTP_400_BAD_REQUEST)
+
+                player = Player(
+                    name=request.data['player_name'],
+                    height=request.data['height'],
+                    games_played=0,
+                    average_score=0.0,
+                    team_id=request.data['team_id'],
+                    user=request.user  # Linking Player to the User
+                )
+                player._slot_reserved = True
+                player.save()
 
         except IntegrityError as e:
             error_message = str(e)
@@ -227,13 +498,15 @@ class CreateGameView(APIView):
         try:
             team1 = Team.objects.get(id=request.data['team1_id'])
             team2 = Team.objects.get(id=request.data['team2_id'])
-            game = Game.objects.create(
-                team1=team1,
-                team2=team2,
-                team1_score=0,
-                team2_score=0,
-                date=now()
-            )
+            with transaction.atomic():
+                game = Game.objects.create(
+                    team1=team1,
+                    team2=team2,
+                    team1_score=0,
+                    team2_score=0,
+                    date=now()
+                )
+                update_standings(None, game)
             serializer = self.serializer_class(game)
 
         except IntegrityError as e:
@@ -250,10 +523,12 @@ class UpdateCountGamesView(APIView):
     def put(self, request, *args, **kwargs):
         try:
             player = Player.objects.get(id=request.data['player_id'])
-            if player.team.coach != request.user:
+            if player.team_id != get_identity(request).team_id:
                 return Response({'detail': 'You do not have permission to update this player.', 'error_code': ERROR_CODES['INVALID_USER_UPDATE_PERMISSION']}, status=status.HTTP_403_FORBIDDEN)
-            player.games_played += 1
-            player.save()
+            # increment in the database, concurrent updates must not overwrite each other
+            player.games_played = F('games_played') + 1
+            player.save(update_fields=['games_played'])
+            player.refresh_from_db(fields=['games_played'])
 
             player_serializer = self.serializer_class(player)
 
@@ -262,6 +537,27 @@ class UpdateCountGamesView(APIView):
 
         return Response(player_serializer.data,status=status.HTTP_200_OK)
 
+# coach credits a played game to the whole roster (or to the listed players) of the team, once per game
+class UpdateRosterCountGamesView(APIView):
+
+    permission_classes = [IsAuthenticatedOr401, IsCoach]
+
+    def post(self, request, *args, **kwargs):
+        team_id = get_identity(request).team_id
+        player_ids = request.data.get('player_ids')
+        try:
+            game_id = int(request.data['game_id'])
+            if player_ids is not None:
+                player_ids = [int(player_id) for player_id in player_ids]
+        except (KeyError, TypeError, ValueError):
+            return Response({'detail': 'A game id and optional player ids are required.', 'error_code': ERROR_CODES['INVALID_ROSTER_GAME']}, status=status.HTTP_400_BAD_REQUEST)
+
+        if team_id is None or not Game.objects.filter(Q(team1_id=team_id) | Q(team2_id=team_id), id=game_id).exists():
+            return Response({'detail': 'Your team did not play this game.', 'error_code': ERROR_CODES['INVALID_ROSTER_GAME']}, status=status.HTTP_400_BAD_REQUEST)
+
+        credited = credit_roster_games_played(game_id, team_id, player_ids)
+        return Response({'game_id': game_id, 'credited_players': credited or 0, 'already_credited': credited is None}, status=status.HTTP_200_OK)
+
 # update the team current score
 class UpdateTeamScoreView(APIView):
 
@@ -270,14 +566,22 @@ class UpdateTeamScoreView(APIView):
 
     def put(self, request, *args, **kwargs):
         try:
-            game = Game.objects.get(id=request.data['game_id'])
-
-            if request.data['team1_score']:
-                game.team1_score = request.data['team1_score']
-            if request.data['team2_score']:
-                game.team2_score = request.data['team2_score']
-
-            game.save()
+            with transaction.atomic():
+                game = Game.objects.select_for_update().get(id=request.data['game_id'])
+                # the standings counted the result of a finalized game, its score is final
+                if game.winner_id is not None:
+                    return Response({'detail': 'Game is already finalized.', 'error_code': ERROR_CODES['GAME_ALREADY_FINALIZED']}, status=status.HTTP_400_BAD_REQUEST)
+                previous_result = get_game_result(game)
+                changes = {}
+
+                if request.data['team1_score']:
+                    game.team1_score = changes['team1_score'] = int(request.data['team1_score'])
+                if request.data['team2_score']:
+                    game.team2_score = changes['team2_score'] = int(request.data['team2_score'])
+
+                game.save()
+                update_standings(previous_result, game)
+                transaction.on_commit(lambda: publish_score_update(game.id, changes))
             game_serializer = self.serializer_class(game)
 
         except IntegrityError as e:
@@ -285,7 +589,150 @@ class UpdateTeamScoreView(APIView):
 
         return Response(game_serializer.data,status=status.HTTP_200_OK)
 
-#  update the team average score by admin
+# update the scores of several games at once, the batch is validated as a whole and applied in one transaction
+class BatchUpdateTeamScoreView(APIView):
+
+    permission_classes = [IsAuthenticatedOr401, IsAdmin]
+    serializer_class = GameScoreUpdateSerializer
+    max_batch_size = 100
+
+    def put(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data, many=True, allow_empty=False, max_length=self.max_batch_size)
+        if not serializer.is_valid():
+            return Response({'detail': 'Invalid score updates.', 'error_code': ERROR_CODES['INVALID_SCORE_BATCH'], 'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        updates = serializer.validated_data
+
+        with transaction.atomic():
+            games = Game.objects.select_for_update().in_bulk([update['game_id'] for update in updates])
+            errors, seen = [], set()
+            for update in updates:
+                if update['game_id'] not in games:
+                    errors.append({'game_id': ['Game not found.']})
+                elif update['game_id'] in seen:
+                    errors.append({'game_id': ['Game is updated more than once.']})
+                elif games[update['game_id']].winner_id is not None:
+                    errors.append({'game_id': ['Game is already finalized.']})
+                else:
+                    errors.append({})
+                seen.add(update['game_id'])
+            if any(errors):
+                return Response({'detail': 'Invalid score updates.', 'error_code': ERROR_CODES['INVALID_SCORE_BATCH'], 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+            results, changes = [], []
+            for update in updates:
+                game = games[update['game_id']]
+                previous_result = get_game_result(game)
+                game_changes = {field: update[field] for field in ('team1_score', 'team2_score') if field in update}
+                for field, value in game_changes.items():
+                    setattr(game, field, value)
+                results.append((previous_result, game))
+                changes.append((game.id, game_changes))
+
+            Game.objects.bulk_update(games.values(), ['team1_score', 'team2_score'])
+            update_standings_for_games(results)
+            # bulk_update does not send post_save, the cached game payloads are invalidated here
+            transaction.on_commit(bump_games_version)
+            transaction.on_commit(lambda: [publish_score_update(game_id, game_changes) for game_id, game_changes in changes])
+
+        return Response([
+            {'game_id': game.id, 'team1_score': game.team1_score, 'team2_score': game.team2_score}
+            for _, game in results
+        ], status=status.HTTP_200_OK)
+
+# admin records the box score lines of a game, player and team averages follow from them
+class RecordGameStatsView(APIView):
+
+    permission_classes = [IsAuthenticatedOr401, IsAdmin]
+    serializer_class = GameStatsSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return Response({'detail': 'Invalid game stats.', 'error_code': ERROR_CODES['INVALID_GAME_STATS'], 'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        lines = serializer.validated_data['stats']
+
+        with transaction.atomic():
+            # one batch per game at a time, the first lines of a team in a game count the game for the team
+            game = Game.objects.select_for_update().filter(id=serializer.validated_data['game_id']).first()
+            if game is None:
+                return Response({'detail': 'Game not found.', 'error_code': ERROR_CODES['INVALID_GAME_STATS']}, status=status.HTTP_400_BAD_REQUEST)
+            player_ids = [line['player_id'] for line in lines]
+            players = Player.objects.select_for_update().only('team', 'average_score', 'total_points', 'scored_games').in_bulk(player_ids)
+            recorded = set(PlayerGameStat.objects.filter(game=game, player_id__in=player_ids).values_list('player_id', flat=True))
+
+            errors, seen = [], set()
+            for line in lines:
+                player = players.get(line['player_id'])
+                if player is None or player.team_id not in (game.team1_id, game.team2_id):
+                    errors.append({'player_id': ['Player did not play for a team of this game.']})
+                elif line['player_id'] in recorded or line['player_id'] in seen:
+                    errors.append({'player_id': ['Player already has a stat line for this game.']})
+                else:
+                    errors.append({})
+                seen.add(line['player_id'])
+            if any(errors):
+                return Response({'detail': 'Invalid game stats.', 'error_code': ERROR_CODES['INVALID_GAME_STATS'], 'errors': {'stats': errors}}, status=status.HTTP_400_BAD_REQUEST)
+
+            record_game_stats(game, [(players[line['player_id']], line['points'], line['minutes']) for line in lines])
+
+        return Response([
+            {'player_id': player.id, 'average_score': player.average_score, 'scored_games': player.scored_games}
+            for player in (players[line['player_id']] for line in lines)
+        ], status=status.HTTP_201_CREATED)
+
+# scorekeepers append point events of live games, the game totals are folded from them
+class ScoreEventView(APIView):
+
+    permission_classes = [IsAuthenticatedOr401, IsAdmin]
+    serializer_class = ScoreEventBatchSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return Response({'detail': 'Invalid score events.', 'error_code': ERROR_CODES['INVALID_SCORE_EVENTS'], 'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        events = serializer.validated_data['events']
+
+        # a plain read, appending events takes no lock on the games
+        games = {
+            game_id: (team1_id, team2_id, winner_id)
+            for game_id, team1_id, team2_id, winner_id in Game.objects.filter(id__in={event['game_id'] for event in events}).values_list('id', 'team1', 'team2', 'winner')
+        }
+        errors = []
+        for event in events:
+            game = games.get(event['game_id'])
+            if game is None:
+                errors.append({'game_id': ['Game not found.']})
+            elif game[2] is not None:
+                errors.append({'game_id': ['Game is already finalized.']})
+            elif event['team_id'] not in game[:2]:
+                errors.append({'team_id': ['Team does not play this game.']})
+            else:
+                errors.append({})
+        if any(errors):
+            return Response({'detail': 'Invalid score events.', 'error_code': ERROR_CODES['INVALID_SCORE_EVENTS'], 'errors': {'events': errors}}, status=status.HTTP_400_BAD_REQUEST)
+
+        ScoreEvent.objects.bulk_create([ScoreEvent(**event) for event in events])
+        # games folded by a concurrent request are skipped, their pending events are picked up by the next fold
+        totals = fold_score_events(games, skip_locked=True)
+        return Response({
+            'accepted': len(events),
+            'games': [{'game_id': game_id, 'team1_score': team1_score, 'team2_score': team2_score} for game_id, (team1_score, team2_score) in totals.items()],
+        }, status=status.HTTP_201_CREATED)
+
+# admin finalizes a game, its pending score events are folded and the leading team is set as the winner
+class FinalizeGameView(APIView):
+
+    permission_classes = [IsAuthenticatedOr401, IsAdmin]
+
+    def post(self, request, pk, *args, **kwargs):
+        if not Game.objects.filter(id=pk).exists():
+            raise NotFound('Game not found.')
+        game = finalize_game(pk)
+        if game is None:
+            return Response({'detail': 'Game is already finalized or tied.', 'error_code': ERROR_CODES['GAME_CANNOT_BE_FINALIZED']}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'game_id': game.id, 'team1_score': game.team1_score, 'team2_score': game.team2_score, 'winner': game.winner_id}, status=status.HTTP_200_OK)
+
+#  recompute the team average score from the stat lines by admin, the averages are not set by hand
 class UpdateAVGTeamScoreView(APIView):
 
     permission_classes = [IsAuthenticatedOr401, IsAdmin]
@@ -294,19 +741,15 @@ class UpdateAVGTeamScoreView(APIView):
     def put(self, request, *args, **kwargs):
         try:
             team = Team.objects.get(id=request.data['team_id'])
-
-            if request.data['average_score']:
-                team.average_score = request.data['average_score']
-
-            team.save()
-            team_serializer = self.serializer_class(team)
-
-        except :
+        except (KeyError, ValueError, TypeError, Team.DoesNotExist):
             return Response({'detail': 'Failed to update Average Team Score.', 'error_code': ERROR_CODES['FAILED_TO_UPDATE_AVG_TEAM_SCORE']}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(team_serializer.data,status=status.HTTP_200_OK)
+        with transaction.atomic():
+            recompute_averages(player_ids=[], team_ids=[team.id])
+        team.refresh_from_db()
+        return Response(self.serializer_class(team).data, status=status.HTTP_200_OK)
 
-#  update the player average score
+#  recompute the player average score from the stat lines by admin
 class UpdateAVGPlayerScoreView(APIView):
 
     permission_classes = [IsAuthenticatedOr401, IsAdmin]
@@ -314,19 +757,14 @@ class UpdateAVGPlayerScoreView(APIView):
 
     def put(self, request, *args, **kwargs):
         try:
-
             player = Player.objects.get(id=request.data['player_id'])
-
-            if request.data['average_score']:
-                player.average_score = request.data['average_score']
-
-            player.save()
-            player_serializer = self.serializer_class(player)
-
-        except :
+        except (KeyError, ValueError, TypeError, Player.DoesNotExist):
             return Response({'detail': 'Failed to update AVG player score.', 'error_code': ERROR_CODES['FAILED_TO_UPDATE_AVG_PLAYER_SCORE']}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(player_serializer.data, status=status.HTTP_200_OK)
+        with transaction.atomic():
+            recompute_averages(player_ids=[player.id], team_ids=[])
+        player.refresh_from_db()
+        return Response(self.serializer_class(player).data, status=status.HTTP_200_OK)
 
 #  remove players from team
 class RemovePlayerView(APIView):
@@ -335,10 +773,9 @@ class RemovePlayerView(APIView):
     
     def delete(self, request, pk, *args, **kwargs):
         player = get_object_or_404(Player, pk=pk)
-        team = player.team
 
         # Ensure that the requesting user is the coach of the team
-        if request.user != team.coach:
+        if player.team_id != get_identity(request).team_id:
             return Response({'detail': 'Only team coach can remove a player', 'error_code': ERROR_CODES['FAILED_TO_REMOVE_PLAYER']},
                             status=status.HTTP_403_FORBIDDEN)
 